@@ -0,0 +1,215 @@
+"""
+Benchmarks of the hot paths of pyapnea: loading sessions, decoding channels, building dataframes, annotating and
+getting elements of `RawOscarDataset`.
+
+Each benchmark is run on the session files of `test/data/raw` and on synthetic sessions of the given lengths (in
+hours). The wall time is the best of `--repeat` runs. The peak memory is measured with `tracemalloc` in a separate
+run: it counts the memory allocated by python and numpy during the benchmark (the inputs prepared before the run and
+memory-mapped files are not counted).
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. python benchmarks/run_benchmarks.py --hours 1 4 8 --output results.csv
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from synthetic_session import write_synthetic_session
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_events import APNEA_EVENTS
+from pyapnea.oscar.oscar_getter import event_data_to_dataframe
+from pyapnea.oscar.oscar_loader import load_session, read_session_header, read_session_metadata, \
+    read_channel_data, decompress_session_data
+from pyapnea.profiling import enable_profiling, format_profile
+from pyapnea.pytorch.raw_oscar_dataset import RawOscarDataset
+from pyapnea.utils.annotations import generate_annotations
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'data', 'raw')
+
+CHANNELS = {1: [ChannelID.CPAP_FlowRate.value],
+            3: [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_MaskPressure.value, ChannelID.CPAP_Leak.value],
+            6: [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_MaskPressure.value, ChannelID.CPAP_Leak.value,
+                ChannelID.CPAP_Pressure.value, ChannelID.CPAP_RespRate.value, ChannelID.CPAP_TidalVolume.value]}
+
+
+@dataclass(slots=True)
+class BenchmarkInput:
+    """ A session file to benchmark, with the data path and the index of its element in a `RawOscarDataset`."""
+    name: str
+    filename: str
+    data_path: str
+    index: int
+
+
+def _bench_load_session(bench_input: BenchmarkInput) -> Callable:
+    return lambda: load_session(bench_input.filename)
+
+
+def _bench_read_channel_data(bench_input: BenchmarkInput) -> Callable:
+    with open(bench_input.filename, 'rb') as file:
+        buffer = file.read()
+    position, header = read_session_header(buffer, 0)
+    if header.compmethod > 0:
+        buffer, position = decompress_session_data(memoryview(buffer)[position:], header.datasize), 0
+
+    def run():
+        data_position, data_data = read_session_metadata(buffer, position)
+        for c in range(data_data.mcsize):
+            data_position, _ = read_channel_data(buffer, data_position, data_data, c)
+        return data_data
+
+    return run
+
+
+def _bench_event_data_to_dataframe(nb_channels: int) -> Callable:
+    def prepare(bench_input: BenchmarkInput) -> Callable:
+        oscar_session_data = load_session(bench_input.filename)
+        return lambda: event_data_to_dataframe(oscar_session_data, CHANNELS[nb_channels])
+
+    return prepare
+
+
+def _bench_generate_annotations(length_event: Optional[str]) -> Callable:
+    def prepare(bench_input: BenchmarkInput) -> Callable:
+        channel_ids = [ChannelID.CPAP_FlowRate.value] + [c.value for c in APNEA_EVENTS]
+        df = event_data_to_dataframe(load_session(bench_input.filename), channel_ids)
+        df.set_index('time_utc', inplace=True)
+        df.sort_index(inplace=True)
+        return lambda: generate_annotations(df, length_event=length_event)
+
+    return prepare
+
+
+def _bench_raw_oscar_dataset(getitem_type: str) -> Callable:
+    def prepare(bench_input: BenchmarkInput) -> Callable:
+        dataset = RawOscarDataset(bench_input.data_path, getitem_type=getitem_type, length_event='10s')
+        return lambda: dataset[bench_input.index]
+
+    return prepare
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkInput], Callable]] = {
+    'load_session': _bench_load_session,
+    'read_channel_data': _bench_read_channel_data,
+    'event_data_to_dataframe_1': _bench_event_data_to_dataframe(1),
+    'event_data_to_dataframe_3': _bench_event_data_to_dataframe(3),
+    'event_data_to_dataframe_6': _bench_event_data_to_dataframe(6),
+    'generate_annotations': _bench_generate_annotations(None),
+    'generate_annotations_length_event': _bench_generate_annotations('10s'),
+    'RawOscarDataset_numpy': _bench_raw_oscar_dataset('numpy'),
+    'RawOscarDataset_dataframe': _bench_raw_oscar_dataset('dataframe'),
+}
+
+
+def measure(run: Callable, repeat: int) -> tuple[float, int]:
+    """
+    Measure the wall time and the peak memory of a function.
+
+    Args:
+        run: function to measure, without arguments
+        repeat: number of runs to measure the wall time
+
+    Returns:
+        The best wall time in seconds and the peak memory allocated during one run in bytes
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def get_inputs(hours: List[float], work_dir: str, compress: bool = False) -> List[BenchmarkInput]:
+    """
+    List the session files of the test data and generate synthetic sessions.
+
+    Args:
+        hours: length in hours of each synthetic session
+        work_dir: directory where synthetic sessions are written
+        compress: if True, the data of synthetic sessions are compressed
+
+    Returns:
+        The inputs of the benchmarks
+    """
+    dataset = RawOscarDataset(TEST_DATA_PATH)
+    inputs = [BenchmarkInput(os.path.basename(f['fullpath']), f['fullpath'], TEST_DATA_PATH, i)
+              for i, f in enumerate(dataset.list_files)]
+    for h in hours:
+        data_path = os.path.join(work_dir, f'{h:g}h')
+        inputs.append(BenchmarkInput(f'synthetic_{h:g}h', write_synthetic_session(data_path, h, compress=compress),
+                                     data_path, 0))
+    return inputs
+
+
+def run_benchmarks(inputs: List[BenchmarkInput], names: List[str], repeat: int) -> pd.DataFrame:
+    """
+    Run benchmarks on inputs.
+
+    Args:
+        inputs: session files to benchmark
+        names: names of the benchmarks to run (see `BENCHMARKS`)
+        repeat: number of runs to measure the wall time
+
+    Returns:
+        A dataframe with one row per benchmark and input
+    """
+    results = []
+    for bench_input in inputs:
+        size = os.path.getsize(bench_input.filename)
+        for name in names:
+            wall_time, peak = measure(BENCHMARKS[name](bench_input), repeat)
+            results.append({'benchmark': name, 'session': bench_input.name, 'file_mb': size / 1e6,
+                            'time_ms': wall_time * 1000, 'peak_mb': peak / 1e6})
+            print(f'{name:<36} {bench_input.name:<20} {wall_time * 1000:>10.2f} ms {peak / 1e6:>10.2f} MB',
+                  flush=True)
+    return pd.DataFrame(results)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hours', type=float, nargs='*', default=[1, 4, 8],
+                        help='length in hours of the synthetic sessions (default: 1 4 8)')
+    parser.add_argument('--compress', action='store_true', help='compress the data of the synthetic sessions')
+    parser.add_argument('--benchmarks', nargs='*', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs to measure the wall time')
+    parser.add_argument('--work-dir', default=None,
+                        help='directory of the synthetic sessions (default: a temporary directory)')
+    parser.add_argument('--output', default=None, help='CSV file of the results')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time spent and the bytes processed per stage (see pyapnea.profiling)')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        enable_profiling()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        inputs = get_inputs(args.hours, args.work_dir if args.work_dir is not None else temp_dir, args.compress)
+        results = run_benchmarks(inputs, args.benchmarks, args.repeat)
+    if args.output is not None:
+        results.to_csv(args.output, index=False, float_format='%.3f')
+    if args.profile:
+        print(format_profile())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Generation of synthetic OSCAR session files of any length for benchmarks.
+
+A synthetic session looks like a ResMed session of the test data: two waveforms sampled at 25 Hz (FlowRate and
+MaskPressureHi), channels sampled about every 2 seconds with explicit times (Pressure, Leak, RespRate...) and flag
+channels (apnea events) with a few events per hour.
+"""
+import os
+
+import numpy as np
+
+from pyapnea.oscar.data_structure import OSCARSessionHeader, OSCARSession, OSCARSessionData, OSCARSessionChannel, \
+    OSCARSessionEvent
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_writer import save_session
+
+# channel id -> (gain, dim, typical value, amplitude)
+WAVEFORM_CHANNELS = {ChannelID.CPAP_FlowRate.value: (0.12, 'L/M', 0.0, 30.0),
+                     ChannelID.CPAP_MaskPressureHi.value: (0.02, 'cmH2O', 8.0, 1.5)}
+PERIODIC_CHANNELS = {ChannelID.CPAP_Pressure.value: (0.02, '', 8.0, 1.0),
+                     ChannelID.CPAP_MaskPressure.value: (0.02, '', 8.0, 1.0),
+                     ChannelID.CPAP_Leak.value: (1.2, '', 10.0, 8.0),
+                     ChannelID.CPAP_RespRate.value: (0.2, '', 15.0, 4.0),
+                     ChannelID.CPAP_TidalVolume.value: (20.0, '', 500.0, 150.0),
+                     ChannelID.CPAP_MinuteVent.value: (0.125, '', 7.0, 2.0),
+                     ChannelID.CPAP_Te.value: (0.02, '', 2.5, 0.5),
+                     ChannelID.CPAP_Ti.value: (0.02, '', 1.5, 0.3)}
+FLAG_CHANNELS = [ChannelID.CPAP_Obstructive.value, ChannelID.CPAP_ClearAirway.value, ChannelID.CPAP_Hypopnea.value,
+                 ChannelID.CPAP_Apnea.value]
+
+WAVEFORM_RATE = 40
+PERIODIC_RATE = 2000
+EVENTS_PER_HOUR = 5
+
+
+def _make_event(ts1: int, relative_times: np.ndarray, values: np.ndarray, gain: float, dim: str,
+                rate: float = 0.0) -> OSCARSessionEvent:
+    """ Build one event from physical values. Times are stored in the file when `rate` is 0."""
+    data = np.round(values / gain).astype(np.int16)
+    evt = OSCARSessionEvent()
+    evt.ts1 = ts1
+    evt.ts2 = ts1 + (int(relative_times[-1]) + int(rate) if len(relative_times) > 0 else 0)
+    evt.evcount = len(data)
+    evt.t8 = 0 if rate > 0 else 1
+    evt.rate = rate
+    evt.gain = gain
+    evt.mn = float(data.min() * gain) if len(data) > 0 else 0.0
+    evt.mx = float(data.max() * gain) if len(data) > 0 else 0.0
+    evt.dim = dim
+    evt.len_dim = len(dim.encode('UTF-16-LE')) if dim else -1
+    evt.data = data
+    if evt.t8 != 0:
+        evt.time = relative_times.astype(np.uint32)
+    return evt
+
+
+def make_session(hours: float, seed: int = 0, sfirst: int = 1643508560000) -> OSCARSession:
+    """
+    Generate a synthetic session.
+
+    Args:
+        hours: length of the session in hours
+        seed: seed of the random values
+        sfirst: beginning of the session in milliseconds since epoch
+
+    Returns:
+        The session, with samples
+    """
+    rng = np.random.default_rng(seed)
+    duration = int(hours * 3600 * 1000)
+    channels = []
+
+    waveform_times = np.arange(0, duration, WAVEFORM_RATE, dtype=np.int64)
+    breath = np.sin(2 * np.pi * waveform_times / 4000.0)
+    for code, (gain, dim, value, amplitude) in WAVEFORM_CHANNELS.items():
+        values = value + amplitude * breath + rng.normal(0, amplitude / 20, len(waveform_times))
+        channels.append(OSCARSessionChannel(code=code, size2=1, events=[
+            _make_event(sfirst, waveform_times, values, gain, dim, rate=float(WAVEFORM_RATE))]))
+
+    for code, (gain, dim, value, amplitude) in PERIODIC_CHANNELS.items():
+        times = np.arange(0, duration, PERIODIC_RATE, dtype=np.int64)
+        times = np.unique(times + rng.integers(0, PERIODIC_RATE // WAVEFORM_RATE, len(times)) * WAVEFORM_RATE)
+        values = value + amplitude * rng.uniform(-1, 1, len(times))
+        channels.append(OSCARSessionChannel(code=code, size2=1, events=[_make_event(sfirst, times, values, gain, dim)]))
+
+    nb_events = max(int(hours * EVENTS_PER_HOUR), 1)
+    for code in FLAG_CHANNELS:
+        # events end at the time of a FlowRate sample and last 10 to 30 seconds
+        times = np.sort(rng.choice(len(waveform_times), nb_events, replace=False)) * WAVEFORM_RATE
+        values = rng.integers(10, 31, nb_events).astype(np.float64)
+        channels.append(OSCARSessionChannel(code=code, size2=1, events=[_make_event(sfirst, times, values, 1.0, '')]))
+
+    oscar_session = OSCARSession()
+    oscar_session.header = OSCARSessionHeader(magicnumber=3341948587, version=10, filetype=1, deviceid=1,
+                                              sessionid=sfirst // 1000, sfirst=sfirst, slast=sfirst + duration,
+                                              compmethod=0, machtype=1)
+    oscar_session.data = OSCARSessionData(mcsize=len(channels), channels=channels)
+    return oscar_session
+
+
+def write_synthetic_session(data_path: str, hours: float, seed: int = 0, compress: bool = False) -> str:
+    """
+    Generate a synthetic session and write it in an OSCAR data path (`data_path/Synthetic_1/Events/`).
+
+    Args:
+        data_path: the data path of the OSCAR data
+        hours: length of the session in hours
+        seed: seed of the random values
+        compress: if True, the session data are compressed
+
+    Returns:
+        Full path of the session file
+    """
+    oscar_session = make_session(hours, seed)
+    events_path = os.path.join(data_path, 'Synthetic_1', 'Events')
+    os.makedirs(events_path, exist_ok=True)
+    filename = os.path.join(events_path, f'{oscar_session.header.sessionid:x}.001')
+    save_session(oscar_session, filename, compress=compress)
+    return filename
@@ -1,4 +1,25 @@
+from . import oscar, pytorch, utils
 from .base_functions import *
-from .oscar import *
-from .pytorch import *
-from .utils import *
+from .oscar.data_structure import *
+from .oscar.oscar_constants import *
+from .oscar.oscar_loader import *
+from .oscar.oscar_catalog import *
+from .oscar.oscar_events import *
+from .oscar.oscar_writer import *
+from .oscar.oscar_stream import *
+from .profiling import *
+
+# modules using pandas or torch are imported on first use of one of their names
+LAZY_NAMES = {name: '.oscar' for name in oscar.LAZY_NAMES}
+LAZY_NAMES.update({name: '.pytorch' for name in pytorch.__all__})
+LAZY_NAMES.update({name: '.utils' for name in utils.__all__})
+
+__all__ = [name for name in globals() if not name.startswith('_')] + list(LAZY_NAMES)
+
+
+def __getattr__(name):
+    return get_lazy_attribute(__name__, LAZY_NAMES, name)
+
+
+def __dir__():
+    return __all__
@@ -1,5 +1,8 @@
+import importlib
 import struct
-from typing import Any
+from typing import Any, Dict
+
+import numpy as np
 
 
 def binary(num: float) -> str:
@@ -50,3 +53,43 @@ def unpack(buffer: bytes, formt: str, position: int) -> tuple[int, tuple[Any, ..
         New unread position after extract the fields and tuple of fields.
     """
     return position + struct.calcsize(formt), struct.unpack_from(formt, buffer, offset=position)
+
+
+def unpack_array(buffer: bytes, dtype: Any, count: int, position: int) -> tuple[int, np.ndarray]:
+    """
+    Unpack `count` contiguous values of the same type from buffer beginning at position.
+
+    The values are decoded with the native byte order (as `unpack` does without a byte order prefix) and the
+    resulting array is a read-only view on `buffer`, no copy is done.
+
+    Args:
+        buffer: Buffer to extract values.
+        dtype: numpy type of one value (ex: `np.int16` for the 'h' struct format).
+        count: number of values to extract.
+        position: position to begin.
+
+    Returns:
+        New unread position after extract the values and the numpy array of values.
+    """
+    dtype = np.dtype(dtype)
+    return position + dtype.itemsize * count, np.frombuffer(buffer, dtype=dtype, count=count, offset=position)
+
+
+def get_lazy_attribute(package: str, lazy_names: Dict[str, str], name: str) -> Any:
+    """
+    Get an attribute of a package whose module is imported on first use (module `__getattr__`, PEP 562).
+    Used to keep heavy dependencies (pandas, torch) out of `import pyapnea`.
+
+    Args:
+        package: name of the package (`__name__`)
+        lazy_names: attribute name -> relative name of the module defining it (or of the module itself for a
+            subpackage)
+        name: name of the attribute
+
+    Returns:
+        The attribute, imported from its module
+    """
+    if name not in lazy_names:
+        raise AttributeError(f'module {package!r} has no attribute {name!r}')
+    module = importlib.import_module(lazy_names[name], package)
+    return module if lazy_names[name] == '.' + name else getattr(module, name)
@@ -1,4 +1,23 @@
 from .data_structure import *
 from .oscar_constants import *
-from .oscar_getter import *
 from .oscar_loader import *
+from .oscar_catalog import *
+from .oscar_events import *
+from .oscar_writer import *
+from .oscar_stream import *
+from ..base_functions import get_lazy_attribute
+
+# modules using pandas are imported on first use of one of their names
+LAZY_NAMES = {name: '.oscar_getter' for name in ['get_channel_from_code', 'event_data_to_dataframe', 'ALIGN_METHODS']}
+LAZY_NAMES.update({name: '.oscar_hdf' for name in ['write_session_to_hdf', 'convert_to_hdf', 'list_hdf_sessions',
+                                                  'read_hdf_channel', 'read_hdf_channels']})
+
+__all__ = [name for name in globals() if not name.startswith('_')] + list(LAZY_NAMES)
+
+
+def __getattr__(name):
+    return get_lazy_attribute(__name__, LAZY_NAMES, name)
+
+
+def __dir__():
+    return __all__
@@ -2,11 +2,16 @@
 Data structure for an Oscar session. It follows the structure of the file described in the following image:
 
 ![image](images/oscar_format.drawio.png)
+
+Samples are stored in numpy arrays (int16 for `data` and `data2`, uint32 for `time`) and classes use `__slots__` to
+keep decoded sessions compact in memory.
 """
 from dataclasses import dataclass, field
 
+import numpy as np
+
 
-@dataclass
+@dataclass(slots=True)
 class OSCARSessionHeader:
     """ Header data for OSCAR session """
     magicnumber: int = 0
@@ -22,7 +27,7 @@ class OSCARSessionHeader:
     crc16: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class OSCARSessionEvent:
     """ Events data for OSCAR session """
     ts1: int = 0
@@ -39,12 +44,24 @@ class OSCARSessionEvent:
     second_field: bool = False
     mn2: float = 0.0
     mx2: float = 0.0
-    data: list[int] = field(default_factory=list[int])
-    data2: list[int] = field(default_factory=list[int])
-    time: list[int] = field(default_factory=list[int])
+    data: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int16))
+    data2: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int16))
+    time: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.uint32))
+
+    def get_time(self) -> np.ndarray:
+        """
+        Get the time of each sample relative to `ts1` (in ms). When `t8 == 0`, the time is not stored in the file
+        (`time` is empty) and is computed from `rate`.
+
+        Returns:
+            An int64 array of `evcount` relative times
+        """
+        if self.t8 == 0:
+            return np.arange(self.evcount, dtype=np.int64) * int(self.rate)
+        return self.time.astype(np.int64)
 
 
-@dataclass
+@dataclass(slots=True)
 class OSCARSessionChannel:
     """ Channel data for OSCAR session"""
     code: int = 0
@@ -52,14 +69,14 @@ class OSCARSessionChannel:
     events: list[OSCARSessionEvent] = field(default_factory=list[OSCARSessionEvent])
 
 
-@dataclass
+@dataclass(slots=True)
 class OSCARSessionData:
-    """ General data for an OSCAR session """
+    """ General data for an OSCAR session. `mcsize` is the number of channels in `channels`. """
     mcsize: int = 0
     channels: list[OSCARSessionChannel] = field(default_factory=list[OSCARSessionChannel])
 
 
-@dataclass
+@dataclass(slots=True)
 class OSCARSession:
     """ OSCAR session data structure """
     header: OSCARSessionHeader = None
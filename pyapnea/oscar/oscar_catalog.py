@@ -0,0 +1,216 @@
+"""
+Persistent catalog of OSCAR session files. The catalog is built from the header and the channel metadata of the
+session files only (see `load_session_metadata`) and stored in a SQLite database. It answers questions like
+"which sessions overlap this night" or "which files contain SpO2" without opening the session files.
+"""
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import List, Optional, Union, Iterable
+
+from .data_structure import OSCARSession
+from .oscar_loader import load_session_metadata, list_session_files
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (path TEXT PRIMARY KEY,
+                                     size INTEGER,
+                                     mtime_ns INTEGER,
+                                     deviceid INTEGER,
+                                     sessionid INTEGER,
+                                     sfirst INTEGER,
+                                     slast INTEGER,
+                                     machtype INTEGER);
+CREATE TABLE IF NOT EXISTS channels (path TEXT,
+                                     code INTEGER,
+                                     nb_events INTEGER,
+                                     evcount INTEGER,
+                                     rate REAL,
+                                     PRIMARY KEY (path, code));
+CREATE TABLE IF NOT EXISTS events (path TEXT,
+                                   code INTEGER,
+                                   event_num INTEGER,
+                                   ts1 INTEGER,
+                                   ts2 INTEGER,
+                                   evcount INTEGER,
+                                   rate REAL,
+                                   PRIMARY KEY (path, code, event_num));
+CREATE INDEX IF NOT EXISTS sessions_time ON sessions (sfirst, slast);
+CREATE INDEX IF NOT EXISTS channels_code ON channels (code);
+"""
+
+
+def _to_ms(value: Union[int, datetime]) -> int:
+    """
+    Convert a datetime to milliseconds since epoch (format used by OSCAR timestamps). Naive datetimes are UTC, as
+    OSCAR timestamps.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    return int(value)
+
+
+class OSCARCatalog:
+
+    def __init__(self, catalog_path: str):
+        """
+        Catalog of OSCAR session files stored in a SQLite database.
+
+        Args:
+            catalog_path: path of the database file. The file is created if it does not exist.
+        """
+        self.catalog_path = catalog_path
+        self.connection = sqlite3.connect(catalog_path)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        """ Close the database connection."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_session(self, filename: str, oscar_session_data: Optional[OSCARSession] = None):
+        """
+        Add (or replace) one session file in the catalog.
+
+        Args:
+            filename: full path of the session file
+            oscar_session_data: OSCARSession of the file. If None, only the metadata of the file are loaded.
+        """
+        # paths are stored as absolute paths, so the catalog does not depend on the current directory
+        filename = os.path.abspath(filename)
+        if oscar_session_data is None:
+            oscar_session_data = load_session_metadata(filename)
+        stat = os.stat(filename)
+        header = oscar_session_data.header
+        with self.connection:
+            self._remove(filename)
+            self.connection.execute('INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (filename, stat.st_size, stat.st_mtime_ns, header.deviceid, header.sessionid,
+                                     header.sfirst, header.slast, header.machtype))
+            for channel in oscar_session_data.data.channels:
+                self.connection.execute('INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?, ?)',
+                                        (filename, channel.code, len(channel.events),
+                                         sum(evt.evcount for evt in channel.events),
+                                         channel.events[0].rate if len(channel.events) > 0 else 0.0))
+                self.connection.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                            [(filename, channel.code, event_num, evt.ts1, evt.ts2, evt.evcount,
+                                              evt.rate)
+                                             for event_num, evt in enumerate(channel.events)])
+
+    def update(self, data_path: str) -> int:
+        """
+        Synchronize the catalog with the session files of an OSCAR data path. New and modified files (size or
+        modification time changed) are scanned, files that do not exist anymore are removed from the catalog.
+
+        Args:
+            data_path: the data path of the OSCAR data. The path must contain the directory of all CPAP machine.
+
+        Returns:
+            Number of scanned files
+        """
+        known_files = {path: (size, mtime_ns) for path, size, mtime_ns in
+                       self.connection.execute('SELECT path, size, mtime_ns FROM sessions')}
+        nb_scanned = 0
+        for filename in list_session_files(data_path):
+            filename = os.path.abspath(filename)
+            stat = os.stat(filename)
+            if known_files.get(filename) != (stat.st_size, stat.st_mtime_ns):
+                self.add_session(filename)
+                nb_scanned += 1
+        with self.connection:
+            for filename in known_files:
+                if not os.path.isfile(filename):
+                    self._remove(filename)
+        return nb_scanned
+
+    def _remove(self, filename: str):
+        for table in ['sessions', 'channels', 'events']:
+            self.connection.execute(f'DELETE FROM {table} WHERE path = ?', (filename,))
+
+    def find_sessions(self,
+                      start: Optional[Union[int, datetime]] = None,
+                      end: Optional[Union[int, datetime]] = None,
+                      channel_ids: Optional[Iterable[int]] = None) -> List[str]:
+        """
+        Find the session files overlapping a time range and containing some channels.
+
+        Args:
+            start: beginning of the time range, as a datetime (UTC if naive) or in milliseconds since epoch. None means
+                no limit.
+            end: end of the time range, as a datetime (UTC if naive) or in milliseconds since epoch. None means no
+                limit.
+            channel_ids: list of channel ids (.value, see channelID in oscar_constants.py) that must all be present
+                in the session. None means no constraint on channels.
+
+        Returns:
+            Sorted list of absolute paths of the session files
+        """
+        query = 'SELECT path FROM sessions WHERE 1'
+        parameters = []
+        if start is not None:
+            query += ' AND slast >= ?'
+            parameters.append(_to_ms(start))
+        if end is not None:
+            query += ' AND sfirst <= ?'
+            parameters.append(_to_ms(end))
+        for channel_id in channel_ids or []:
+            query += ' AND path IN (SELECT path FROM channels WHERE code = ?)'
+            parameters.append(channel_id)
+        query += ' ORDER BY path'
+        return [path for (path,) in self.connection.execute(query, parameters)]
+
+    def get_session(self, filename: str) -> Optional[dict]:
+        """
+        Get the header information of one session file.
+
+        Args:
+            filename: full path of the session file
+
+        Returns:
+            A dictionary with keys 'path', 'size', 'mtime_ns', 'deviceid', 'sessionid', 'sfirst', 'slast' and
+            'machtype' or None if the file is not in the catalog
+        """
+        cursor = self.connection.execute('SELECT * FROM sessions WHERE path = ?', (os.path.abspath(filename),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cursor.description], row))
+
+    def get_channels(self, filename: str) -> List[dict]:
+        """
+        Get the channels of one session file.
+
+        Args:
+            filename: full path of the session file
+
+        Returns:
+            A list of dictionaries with keys 'code', 'nb_events', 'evcount' (total number of samples) and 'rate'
+        """
+        cursor = self.connection.execute('SELECT code, nb_events, evcount, rate FROM channels WHERE path = ? '
+                                         'ORDER BY code', (os.path.abspath(filename),))
+        return [dict(zip([c[0] for c in cursor.description], row)) for row in cursor]
+
+    def get_events(self, filename: str, channel_id: Optional[int] = None) -> List[dict]:
+        """
+        Get the events of one session file.
+
+        Args:
+            filename: full path of the session file
+            channel_id: channel id (.value, see channelID in oscar_constants.py). None means all channels.
+
+        Returns:
+            A list of dictionaries with keys 'code', 'event_num', 'ts1', 'ts2', 'evcount' and 'rate'
+        """
+        query = 'SELECT code, event_num, ts1, ts2, evcount, rate FROM events WHERE path = ?'
+        parameters = [os.path.abspath(filename)]
+        if channel_id is not None:
+            query += ' AND code = ?'
+            parameters.append(channel_id)
+        cursor = self.connection.execute(query + ' ORDER BY code, event_num', parameters)
+        return [dict(zip([c[0] for c in cursor.description], row)) for row in cursor]
@@ -256,3 +256,6 @@ CHANNELS = [[GRP_CPAP, ChannelID.CPAP_Pressure, ChanType.WAVEFORM, MachineType.M
             [GRP_CPAP, ChannelID.RMS9_MaskOnTime        , ChanType.DATA,   MachineType.MT_CPAP,  ScopeType.SESSION, "MaskOnTime",  STR_UNIT_Unknown,   "red"],
             [GRP_CPAP, ChannelID.CPAP_SummaryOnly      , ChanType.DATA,   MachineType.MT_CPAP,  ScopeType.SESSION, "SummaryOnly",   STR_UNIT_Unknown,   "red"],
             [GRP_CPAP, ChannelID.CPAP_Mode, ChanType.SETTING,   MachineType.MT_CPAP,  ScopeType.SESSION, "PAPMode", "red"]]
+
+# lookup table of the channel names by channel id (.value of ChannelID)
+CHANNEL_NAMES = {c[1].value: c[5] for c in CHANNELS}
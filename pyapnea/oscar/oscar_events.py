@@ -0,0 +1,267 @@
+"""
+Sparse representation of the flag events of a session (apnea, hypopnea...) as intervals.
+
+A flag channel stores one sample per event: the time of the sample is the end of the event and the value is the
+duration of the event reported by the device (in seconds). `EventIntervals` keeps these events as
+`(start, end, type, value)` arrays instead of mostly-NaN columns of a dataframe, and answers which events overlap a
+time window with binary searches.
+"""
+from dataclasses import dataclass, field
+from typing import Optional, Iterable, Union
+
+import numpy as np
+
+from .data_structure import OSCARSession, OSCARSessionChannel
+from .oscar_constants import ChannelID
+from .oscar_loader import load_session
+
+APNEA_EVENTS = [ChannelID.CPAP_ClearAirway, ChannelID.CPAP_Obstructive, ChannelID.CPAP_Hypopnea, ChannelID.CPAP_Apnea]
+
+
+def _get_codes(channel_ids: Optional[Iterable[Union[ChannelID, int]]]) -> set:
+    channel_ids = channel_ids if channel_ids else APNEA_EVENTS
+    return {c.value if isinstance(c, ChannelID) else c for c in channel_ids}
+
+
+def _interval_labels(starts: np.ndarray, ends: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """ True for each time inside at least one interval [start, end]. Times do not need to be sorted."""
+    nb_started = np.searchsorted(np.sort(starts), times, side='right')
+    nb_ended = np.searchsorted(np.sort(ends), times, side='left')
+    return nb_started > nb_ended
+
+
+@dataclass(slots=True)
+class EventIntervals:
+    """
+    Flag events of a session sorted by end time.
+
+    `start` and `end` are in milliseconds since epoch, `type` is the channel id (.value of ChannelID) of the flag
+    channel and `value` is the value of the flag (duration of the event in seconds).
+    """
+    start: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    end: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    type: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    value: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    max_duration: int = 0
+
+    @classmethod
+    def from_session(cls,
+                     oscar_session_data: OSCARSession,
+                     channel_ids: Optional[Iterable[Union[ChannelID, int]]] = None) -> 'EventIntervals':
+        """
+        Build the intervals from the flag channels of a session. Flags with a value of 0 are not events (as in
+        `generate_annotations`).
+
+        Args:
+            oscar_session_data: OSCARSession filled from file
+            channel_ids: list of flag channels (ChannelID or .value). None means the apnea events (`APNEA_EVENTS`).
+
+        Returns:
+            The events of the channels
+        """
+        codes = _get_codes(channel_ids)
+        ends, types, values = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        for channel in oscar_session_data.data.channels:
+            if channel.code not in codes:
+                continue
+            for evt in channel.events:
+                value = evt.data * evt.gain
+                is_event = value != 0
+                ends.append((evt.get_time() + evt.ts1)[is_event])
+                values.append(value[is_event].astype(np.float64))
+                types.append(np.full(is_event.sum(), channel.code, dtype=np.int64))
+        end, type_, value = np.concatenate(ends), np.concatenate(types), np.concatenate(values)
+        order = np.argsort(end, kind='stable')
+        duration = np.round(np.abs(value) * 1000).astype(np.int64)
+        return cls(start=end[order] - duration[order], end=end[order], type=type_[order], value=value[order],
+                   max_duration=int(duration.max()) if len(duration) > 0 else 0)
+
+    def __len__(self):
+        return len(self.end)
+
+    def overlapping(self, start: int, end: int) -> np.ndarray:
+        """
+        Find the events overlapping the time window [start, end]. Only the events ending in
+        [start, end + max_duration] are checked, found with a binary search.
+
+        Args:
+            start: beginning of the window in milliseconds since epoch
+            end: end of the window in milliseconds since epoch
+
+        Returns:
+            Positions of the events overlapping the window, in end time order
+        """
+        first = np.searchsorted(self.end, start, side='left')
+        last = np.searchsorted(self.end, end + self.max_duration, side='right')
+        candidates = np.arange(first, last)
+        return candidates[self.start[first:last] <= end]
+
+    def select(self, channel_ids: Iterable[Union[ChannelID, int]]) -> 'EventIntervals':
+        """
+        Keep only the events of some flag channels.
+
+        Args:
+            channel_ids: list of flag channels (ChannelID or .value)
+
+        Returns:
+            The events of the channels
+        """
+        return self.subset(np.isin(self.type, list(_get_codes(channel_ids))))
+
+    def subset(self, keep: np.ndarray) -> 'EventIntervals':
+        """
+        Keep only some events.
+
+        Args:
+            keep: boolean array, True for each event to keep
+
+        Returns:
+            The kept events
+        """
+        duration = self.end[keep] - self.start[keep]
+        return EventIntervals(start=self.start[keep], end=self.end[keep], type=self.type[keep],
+                              value=self.value[keep], max_duration=int(duration.max()) if len(duration) > 0 else 0)
+
+    def count_overlapping(self, starts: np.ndarray, ends: np.ndarray, length: Optional[int] = None) -> np.ndarray:
+        """
+        Count the events overlapping each time window [start, end]: the events starting before the end of the
+        window minus the events ending before its beginning.
+
+        Args:
+            starts: beginning of each window in milliseconds since epoch
+            ends: end of each window in milliseconds since epoch
+            length: length of the events in milliseconds (see `labels`). None means the duration of each event.
+
+        Returns:
+            Number of events overlapping each window
+        """
+        event_starts = self.start if length is None else self.end - length
+        return (np.searchsorted(np.sort(event_starts), np.asarray(ends), side='right') -
+                np.searchsorted(self.end, np.asarray(starts), side='left'))
+
+    def labels(self, times: np.ndarray, length: Optional[int] = None) -> np.ndarray:
+        """
+        Label times with the events.
+
+        Args:
+            times: times in milliseconds since epoch (not necessarily sorted)
+            length: length of the events in milliseconds (a time is labelled when an event ends within `length`
+                after it, as `length_event` in `generate_annotations`). None means the duration of each event.
+
+        Returns:
+            A boolean array, True for times inside an event
+        """
+        starts = self.start if length is None else self.end - length
+        return _interval_labels(starts, self.end, np.asarray(times))
+
+
+def load_event_intervals(filename: str,
+                         channel_ids: Optional[Iterable[Union[ChannelID, int]]] = None) -> EventIntervals:
+    """
+    Load the flag events of a session file. Only the flag channels are decoded, the other channels (waveforms) are
+    skipped.
+
+    Args:
+        filename: full path of the session file
+        channel_ids: list of flag channels (ChannelID or .value). None means the apnea events (`APNEA_EVENTS`).
+
+    Returns:
+        The events of the session
+    """
+    codes = _get_codes(channel_ids)
+    return EventIntervals.from_session(load_session(filename, use_mmap=True, channels=codes), codes)
+
+
+def _is_sample_time(times: np.ndarray, channel: OSCARSessionChannel) -> np.ndarray:
+    """ True for each time (ms since epoch) equal to the time of a sample of the channel."""
+    result = np.zeros(len(times), dtype=bool)
+    for evt in channel.events:
+        if evt.t8 == 0 and int(evt.rate) > 0:
+            sample_num, remainder = np.divmod(times - evt.ts1, int(evt.rate))
+            result |= (remainder == 0) & (sample_num >= 0) & (sample_num < evt.evcount)
+        else:
+            result |= np.isin(times, evt.get_time() + evt.ts1)
+    return result
+
+
+class EventIndex:
+
+    def __init__(self,
+                 filenames: Iterable[str],
+                 channel_ids: Optional[Iterable[Union[ChannelID, int]]] = None,
+                 reference_channel_id: Optional[int] = None):
+        """
+        Index of the flag events of several session files (one item per file). Only the flag channels are decoded:
+        waveforms are skipped, so the index is built much faster than loading the items of a dataset.
+
+        Args:
+            filenames: full paths of the session files
+            channel_ids: list of flag channels (ChannelID or .value). None means the apnea events (`APNEA_EVENTS`).
+            reference_channel_id: channel id (.value) of a channel of the items. If not None, only the events at the
+                time of a sample of this channel are kept, as in a dataframe where the rows without this channel
+                are removed. Only the metadata of the channel are needed when its samples are regularly spaced.
+        """
+        self.filenames = list(filenames)
+        self.codes = _get_codes(channel_ids)
+        self.reference_channel_id = reference_channel_id
+        self.intervals = [self._load_intervals(filename) for filename in self.filenames]
+        self._contains_event = None
+
+    def _load_intervals(self, filename: str) -> EventIntervals:
+        channels = self.codes if self.reference_channel_id is None else self.codes | {self.reference_channel_id}
+        oscar_session_data = load_session(filename, use_mmap=True, channels=channels)
+        intervals = EventIntervals.from_session(oscar_session_data, self.codes)
+        if self.reference_channel_id is not None:
+            reference_channel = next((channel for channel in oscar_session_data.data.channels
+                                      if channel.code == self.reference_channel_id), OSCARSessionChannel())
+            intervals = intervals.subset(_is_sample_time(intervals.end, reference_channel))
+        return intervals
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def nb_events(self) -> np.ndarray:
+        """
+        Returns:
+            Number of events of each item
+        """
+        return np.array([len(intervals) for intervals in self.intervals], dtype=np.int64)
+
+    def contains_event(self) -> np.ndarray:
+        """
+        Returns:
+            True for each item containing at least one event (read-only array computed on first call)
+        """
+        if self._contains_event is None:
+            self._contains_event = self.nb_events() > 0
+            self._contains_event.flags.writeable = False
+        return self._contains_event
+
+    def window_counts(self, item: int, starts: np.ndarray, ends: np.ndarray,
+                      length: Optional[int] = None) -> np.ndarray:
+        """
+        Count the events overlapping time windows of one item (see `EventIntervals.count_overlapping`).
+
+        Args:
+            item: index of the item
+            starts: beginning of each window in milliseconds since epoch
+            ends: end of each window in milliseconds since epoch
+            length: length of the events in milliseconds. None means the duration of each event.
+
+        Returns:
+            Number of events overlapping each window
+        """
+        return self.intervals[item].count_overlapping(starts, ends, length)
+
+    def class_balance(self, counts: Optional[np.ndarray] = None) -> float:
+        """
+        Fraction of positive items (or windows).
+
+        Args:
+            counts: number of events of each window (see `window_counts`). None means the items.
+
+        Returns:
+            Fraction of items (or windows) with at least one event
+        """
+        counts = self.nb_events() if counts is None else np.asarray(counts)
+        return float(np.mean(counts > 0)) if len(counts) > 0 else 0.0
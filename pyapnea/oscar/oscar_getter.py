@@ -1,9 +1,12 @@
-from typing import Union, List, Any, Dict, Optional
+from typing import Union, List, Any, Dict, Optional, Iterable
 
+import numpy as np
 import pandas as pd
 
-from .oscar_constants import CHANNELS
+from .oscar_constants import CHANNEL_NAMES
 from .data_structure import OSCARSession, OSCARSessionChannel
+from .oscar_loader import load_session
+from ..profiling import profile_stage
 
 
 def get_channel_from_code(oscar_session_data: OSCARSession, channel_id: int) -> Union[OSCARSessionChannel, None]:
@@ -17,21 +20,186 @@ def get_channel_from_code(oscar_session_data: OSCARSession, channel_id: int) ->
     Returns:
         Channel data (`OSCARSessionChannel`) or None if the channelID is not found in the session
     """
-    list_result = [item for item in oscar_session_data.data.channels if item.code == channel_id]
-    if len(list_result) > 0:
-        return list_result[0]
-    else:
+    return next((item for item in oscar_session_data.data.channels if item.code == channel_id), None)
+
+
+def _get_channel_frame(channel: OSCARSessionChannel) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Concatenate the events of a channel into columns: 'time_utc' (ms since epoch), ChannelID text (gain applied),
+    ChannelID text + "2" (if any event has a second field) and 'index' (position of each sample in its event).
+    Returns None if the channel has no event.
+    """
+    if len(channel.events) == 0:
         return None
+    y_col_name = CHANNEL_NAMES[channel.code]
+    frame = {'time_utc': np.concatenate([evt.get_time() + evt.ts1 for evt in channel.events]),
+             y_col_name: np.concatenate([evt.data * evt.gain for evt in channel.events])}
+    if any(evt.second_field for evt in channel.events):
+        frame[y_col_name + '2'] = np.concatenate([evt.data2 * evt.gain if evt.second_field
+                                                  else np.full(evt.evcount, np.nan)
+                                                  for evt in channel.events])
+    frame['index'] = np.concatenate([np.arange(evt.evcount) for evt in channel.events])
+    return frame
+
+
+def _frame_to_dataframe(frame: Dict[str, np.ndarray], keep_index: bool = True) -> pd.DataFrame:
+    """ Build a dataframe from columns of `_get_channel_frame`, with 'time_utc' converted to UTC datetimes."""
+    columns = {name: values for name, values in frame.items() if name != 'index'}
+    if 'time_utc' in columns:
+        columns['time_utc'] = pd.to_datetime(columns['time_utc'], unit='ms', utc=True)
+    return pd.DataFrame(columns, index=frame['index'] if keep_index and 'index' in frame else None)
+
+
+def _outer_join_indexers(list_keys: List[np.ndarray]) -> tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Compute in one pass the outer join of several arrays of keys, sorted by key, with the same rows as merging them
+    one after the other with `pd.merge(how='outer')`: duplicated keys give the cartesian product of the rows of each
+    array, in the order of the arrays then in the order of the rows.
+
+    Returns:
+        Keys of the join and, for each array, the positions of its rows in the join (-1 when the key is missing)
+    """
+    orders = [np.argsort(keys, kind='stable') for keys in list_keys]
+    list_sorted = [keys[order] for keys, order in zip(list_keys, orders)]
+    union_keys = np.unique(np.concatenate(list_sorted))
+
+    # for each array: number of rows and position of the first row of each key of the union
+    counts, starts = [], []
+    for sorted_keys in list_sorted:
+        first_rows = np.flatnonzero(np.diff(sorted_keys, prepend=sorted_keys[:1] - 1) != 0)
+        positions = np.searchsorted(union_keys, sorted_keys[first_rows])
+        count = np.zeros(len(union_keys), dtype=np.int64)
+        count[positions] = np.diff(first_rows, append=len(sorted_keys))
+        start = np.zeros(len(union_keys), dtype=np.int64)
+        start[positions] = first_rows
+        counts.append(count)
+        starts.append(start)
+
+    # a missing key counts for one row of NaN
+    nb_rows = np.ones(len(union_keys), dtype=np.int64)
+    for count in counts:
+        nb_rows *= np.maximum(count, 1)
+    if np.all(nb_rows == 1):
+        key_num = np.arange(len(union_keys))
+        row_in_key = np.zeros(len(union_keys), dtype=np.int64)
+    else:
+        key_num = np.repeat(np.arange(len(union_keys)), nb_rows)
+        row_in_key = np.arange(len(key_num)) - np.repeat(np.cumsum(nb_rows) - nb_rows, nb_rows)
+
+    # the row in a key is decomposed in the rows of each array, the first array being the most significant
+    list_index = []
+    for order, count, start in reversed(list(zip(orders, counts, starts))):
+        nb = np.maximum(count[key_num], 1)
+        row_in_key, row = np.divmod(row_in_key, nb)
+        index = np.full(len(key_num), -1)
+        present = count[key_num] > 0
+        index[present] = order[start[key_num[present]] + row[present]]
+        list_index.insert(0, index)
+    return union_keys[key_num], list_index
+
+
+def _take(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """ Take values at positions, NaN where the position is -1."""
+    result = values[index] if len(values) > 0 else np.full(len(index), np.nan)
+    result[index < 0] = np.nan
+    return result
+
+
+def _join_frames(channel_frames: List[Dict[str, np.ndarray]]) -> pd.DataFrame:
+    """
+    Outer join of channel frames on 'time_utc', sorted by 'time_utc'. Same rows and columns as merging the
+    channels one after the other with `pd.merge(how='outer')`: if a column already exists, the column of the next
+    channel is dropped.
+    """
+    time_utc, list_index = _outer_join_indexers([frame['time_utc'] for frame in channel_frames])
+    columns = {'time_utc': time_utc}
+    for frame, index in zip(channel_frames, list_index):
+        columns.update({name: _take(values, index) for name, values in frame.items()
+                        if name not in columns and name != 'index'})
+    return _frame_to_dataframe(columns)
+
 
+ALIGN_METHODS = ['ffill', 'nearest', 'interpolate']
 
-def event_data_to_dataframe(oscar_session_data: OSCARSession,
+
+def _align_frame(frame: Dict[str, np.ndarray],
+                 grid: np.ndarray,
+                 method: str,
+                 tolerance: Optional[int]) -> Dict[str, np.ndarray]:
+    """
+    Project the columns of a channel frame on the times of `grid` (ms since epoch, sorted).
+
+    - 'ffill': last sample at or before the grid time
+    - 'nearest': nearest sample (the earlier one in case of tie)
+    - 'interpolate': linear interpolation between the samples around the grid time, NaN outside the channel
+
+    With `tolerance`, grid times further than `tolerance` ms from the used samples are NaN.
+    """
+    if method not in ALIGN_METHODS:
+        raise ValueError(f'align_method must be one of {ALIGN_METHODS}, got {method!r}')
+    order = np.argsort(frame['time_utc'], kind='stable')
+    times = frame['time_utc'][order]
+    columns = {name: values[order] for name, values in frame.items() if name not in ['time_utc', 'index']}
+    if len(times) == 0:
+        return {name: np.full(len(grid), np.nan) for name in columns}
+    after = np.searchsorted(times, grid, side='left')
+    before = np.searchsorted(times, grid, side='right') - 1
+    has_before, has_after = before >= 0, after < len(times)
+    distance_before = np.where(has_before, grid - times[np.maximum(before, 0)], np.iinfo(np.int64).max)
+    distance_after = np.where(has_after, times[np.minimum(after, len(times) - 1)] - grid, np.iinfo(np.int64).max)
+
+    if method == 'interpolate':
+        valid = has_before & has_after
+        distance = np.maximum(distance_before, distance_after)
+        aligned = {name: np.interp(grid, times, values.astype(np.float64), left=np.nan, right=np.nan)
+                   for name, values in columns.items()}
+    else:
+        if method == 'ffill':
+            position, distance, valid = before, distance_before, has_before
+        else:
+            use_after = distance_after < distance_before
+            position = np.where(use_after, after, before)
+            distance = np.where(use_after, distance_after, distance_before)
+            valid = has_before | has_after
+        aligned = {name: _take(values.astype(np.float64), np.where(valid, position, -1))
+                   for name, values in columns.items()}
+    if tolerance is not None:
+        valid &= distance <= tolerance
+    for values in aligned.values():
+        values[~valid] = np.nan
+    return aligned
+
+
+def _align_frames(channel_frames: Dict[int, Dict[str, np.ndarray]],
+                  grid: np.ndarray,
+                  align_method: Union[str, Dict[int, str]],
+                  tolerance: Optional[int]) -> pd.DataFrame:
+    """ Project all channel frames (channel id -> frame) on `grid` and build one dataframe with a row per grid time."""
+    columns = {'time_utc': grid}
+    for code, frame in channel_frames.items():
+        method = align_method.get(code, 'ffill') if isinstance(align_method, dict) else align_method
+        aligned = _align_frame(frame, grid, method, tolerance)
+        columns.update({name: values for name, values in aligned.items() if name not in columns})
+    return _frame_to_dataframe(columns)
+
+
+def event_data_to_dataframe(oscar_session_data: Union[OSCARSession, str],
                             channel_ids: List[Any],
-                            mis_value_strategy: Optional[Dict[str, Union[str, float]]] = None) -> pd.DataFrame:
+                            mis_value_strategy: Optional[Dict[str, Union[str, float]]] = None,
+                            align_to: Optional[int] = None,
+                            align_period: Optional[int] = None,
+                            align_method: Union[str, Dict[int, str]] = 'ffill',
+                            tolerance: Optional[int] = None) -> pd.DataFrame:
     """
     Get the event data as dataframe of an OSCARSession from channelIDs.
 
+    By default, channels are merged on 'time_utc' (outer join): the dataframe has one row per time of any channel.
+    With `align_to` or `align_period`, all channels are projected on a reference grid instead: the dataframe has one
+    row per time of the grid, so its size does not depend on the rate of the other channels.
+
     Args:
-        oscar_session_data: OSCARSession filled from file
+        oscar_session_data: OSCARSession filled from file, or the filename of a session file. When a filename is
+            given, only the channels in `channel_ids` (and `align_to`) are decoded from the file.
         channel_ids: List of channel id (see channelID in oscar_constants.py)
         mis_value_strategy: Strategy to deal with missing value on one channel.
 
@@ -39,7 +207,17 @@ def event_data_to_dataframe(oscar_session_data: OSCARSession,
             - Dictionary containing a channel id as key and a strategy as value:
                 * 'ignore' : remove rows where the channel is nan
                 * `float` : replace NaN value in the channel by the float value
+        align_to: channel id whose times are the reference grid. The channel does not need to be in `channel_ids`.
+        align_period: period in milliseconds of a regular reference grid, from the first to the last sample of the
+            channels
+        align_method: how channels are projected on the grid, one method for all channels or a dictionary containing
+            a channel id as key and a method as value ('ffill' for missing channels):
 
+            - 'ffill' : last sample at or before the grid time
+            - 'nearest' : nearest sample
+            - 'interpolate' : linear interpolation between the samples around the grid time
+        tolerance: maximum distance in milliseconds between a grid time and the samples used for it, NaN beyond.
+            None means no limit.
 
     Returns:
         A dataframe with the following columns : ["time",  "time_utc", \
@@ -47,54 +225,88 @@ def event_data_to_dataframe(oscar_session_data: OSCARSession,
         if no channel_ids are found, return an empty dataframe containing \
         one column named 'no_channel'
     """
-    global_df = pd.DataFrame(columns=['no_channel'])
-    for channel in oscar_session_data.data.channels:
-        if channel.code in channel_ids:
-            y_col_name = [c[5] for c in CHANNELS if c[1].value == channel.code][0]
-            df_channel = pd.DataFrame(columns=['no_event'])
-            for evt in channel.events:
-                gain = evt.gain
-                if evt.t8 == 0:
-                    evt.time = range(0, evt.evcount * int(evt.rate), int(evt.rate))
-                df = pd.DataFrame(data={'time': evt.time,
-                                        'data': evt.data})
-                df[y_col_name] = df['data'] * gain
-
-                if evt.second_field:
-                    # not tested because do not have 2nd field in files
-                    df['data2'] = evt.data2
-                    df[y_col_name + '2'] = df['data2'] * gain
-
-                df['time_utc'] = df['time'] + evt.ts1
-                df['time_utc'] = pd.to_datetime(df['time_utc'], unit='ms')
-                df['time_utc'] = df['time_utc'].dt.tz_localize('UTC')
-
-                # deleting no gain columns and relative time
-                df.drop(['time', 'data', 'data2'], axis=1, inplace=True, errors='ignore')
-
-                # reordering columns 'time_utc at first
-                temp_cols = df.columns.tolist()
-                new_cols = temp_cols[-1:] + temp_cols[:-1]
-                df = df[new_cols]
-
-                if df_channel.empty:
-                    df_channel = df
-                else:
-                    df_channel = pd.concat([df_channel, df])
-
-            if global_df.empty:
-                global_df = df_channel
-            else:
-                global_df = pd.merge(global_df, df_channel, on='time_utc', how='outer', suffixes=('', '_DROP')).filter(
-                    regex='^(?!.*_DROP)')
-
-            # apply missing value strategies
-            if mis_value_strategy:
-                for channel, strategy in mis_value_strategy.items():
-                    col_name = [c[5] for c in CHANNELS if c[1].value == channel][0]
-                    if col_name in global_df.columns:
-                        if strategy == 'ignore':
-                            global_df = global_df[global_df[col_name].notnull()]
-                        if isinstance(strategy, float):
-                            global_df[col_name].fillna(strategy, inplace=True)
+    if align_to is not None and align_period is not None:
+        raise ValueError('align_to and align_period cannot be used together')
+    if isinstance(oscar_session_data, str):
+        channels = channel_ids if align_to is None else list(channel_ids) + [align_to]
+        oscar_session_data = load_session(oscar_session_data, use_mmap=True, channels=channels)
+    if align_to is not None or align_period is not None:
+        global_df = _event_data_to_aligned_dataframe(oscar_session_data, channel_ids, align_to, align_period,
+                                                     align_method, tolerance)
+    else:
+        global_df = _event_data_to_merged_dataframe(oscar_session_data, channel_ids)
+
+    # apply missing value strategies
+    if mis_value_strategy:
+        with profile_stage('oscar_getter.missing_values'):
+            for channel, strategy in mis_value_strategy.items():
+                col_name = CHANNEL_NAMES[channel]
+                if col_name in global_df.columns:
+                    if strategy == 'ignore':
+                        global_df = global_df[global_df[col_name].notnull()]
+                    if isinstance(strategy, float):
+                        global_df = global_df.fillna({col_name: strategy})
     return global_df
+
+
+def _get_frames_nbytes(channel_frames: Iterable[Dict[str, np.ndarray]]) -> int:
+    return sum(values.nbytes for frame in channel_frames for values in frame.values())
+
+
+def _event_data_to_merged_dataframe(oscar_session_data: OSCARSession, channel_ids: List[Any]) -> pd.DataFrame:
+    """ Outer join of the channels on 'time_utc' (see `event_data_to_dataframe`)."""
+    # as in an iterative outer merge, channels are joined from the first channel that contains data
+    with profile_stage('oscar_getter.build') as stage:
+        channel_frames = []
+        for channel in oscar_session_data.data.channels:
+            if channel.code in channel_ids:
+                channel_frame = _get_channel_frame(channel)
+                if len(channel_frames) == 0 or len(channel_frames[0].get('time_utc', [])) == 0:
+                    channel_frames = [channel_frame if channel_frame is not None else {'no_event': np.empty(0)}]
+                elif channel_frame is not None:
+                    channel_frames.append(channel_frame)
+        if stage.enabled:
+            stage.nbytes = _get_frames_nbytes(channel_frames)
+
+    if len(channel_frames) == 0:
+        return pd.DataFrame(columns=['no_channel'])
+    with profile_stage('oscar_getter.merge', stage.nbytes):
+        if len(channel_frames) == 1:
+            return _frame_to_dataframe(channel_frames[0])
+        return _join_frames(channel_frames)
+
+
+def _event_data_to_aligned_dataframe(oscar_session_data: OSCARSession,
+                                     channel_ids: List[Any],
+                                     align_to: Optional[int],
+                                     align_period: Optional[int],
+                                     align_method: Union[str, Dict[int, str]],
+                                     tolerance: Optional[int]) -> pd.DataFrame:
+    """ Projection of the channels on a reference grid (see `event_data_to_dataframe`)."""
+    with profile_stage('oscar_getter.build') as stage:
+        channel_frames = {}
+        grid = None
+        for channel in oscar_session_data.data.channels:
+            # other channels are not decoded
+            if channel.code not in channel_ids and channel.code != align_to:
+                continue
+            channel_frame = _get_channel_frame(channel)
+            if channel_frame is None:
+                continue
+            if channel.code in channel_ids:
+                channel_frames[channel.code] = channel_frame
+            if channel.code == align_to:
+                grid = np.unique(channel_frame['time_utc'])
+        if stage.enabled:
+            stage.nbytes = _get_frames_nbytes(channel_frames.values())
+
+    if len(channel_frames) == 0:
+        return pd.DataFrame(columns=['no_channel'])
+    if align_period is not None:
+        first_time = min(frame['time_utc'].min() for frame in channel_frames.values())
+        last_time = max(frame['time_utc'].max() for frame in channel_frames.values())
+        grid = np.arange(first_time, last_time + 1, align_period, dtype=np.int64)
+    elif grid is None:
+        return pd.DataFrame(columns=['no_channel'])
+    with profile_stage('oscar_getter.align', stage.nbytes):
+        return _align_frames(channel_frames, grid, align_method, tolerance)
@@ -0,0 +1,231 @@
+"""
+Conversion of OSCAR session files to a HDF5 file and random access to the converted channels.
+This module needs the optional `h5py` package.
+
+Structure of the HDF5 file:
+
+- one group per session: `/<deviceid>/<sessionid>` with attributes `deviceid`, `sessionid`, `sfirst`, `slast` and
+  `source` (absolute path of the session file)
+- one group per channel inside a session group, named with the channel lookup name (ex: 'FlowRate', or the channel
+  id for channels unknown to pyapnea) with an attribute `code` (channel id) and the datasets:
+    * `time_utc`: time of each sample in milliseconds since epoch (int64, sorted)
+    * `<channel name>` (and `<channel name>2` for channels with a second field): values with gain applied (float32)
+    * `time_index`: first time of each chunk of `time_utc`, used to find a time range without reading `time_utc`
+"""
+import os
+from typing import Optional, List, Iterable
+
+import numpy as np
+import pandas as pd
+
+from .data_structure import OSCARSession
+from .oscar_constants import CHANNEL_NAMES
+from .oscar_loader import load_session, list_session_files
+
+
+def _import_h5py():
+    try:
+        import h5py
+    except ImportError as error:
+        raise ImportError('h5py is needed to read and write HDF5 files, install it with `pip install h5py`') from error
+    return h5py
+
+
+def _get_channel_name(channel_id: int) -> str:
+    """ Name of the group of a channel: the channel lookup name, or the channel id if the channel is unknown."""
+    return CHANNEL_NAMES.get(channel_id, str(channel_id))
+
+
+def write_session_to_hdf(oscar_session_data: OSCARSession,
+                         hdf_file,
+                         source: str = '',
+                         chunk_size: int = 65536,
+                         compression: Optional[str] = 'gzip'):
+    """
+    Write all decoded channels of a session into an open HDF5 file. An existing group of the same session is replaced.
+
+    Args:
+        oscar_session_data: OSCARSession filled from file
+        hdf_file: `h5py.File` opened in write mode
+        source: path of the session file, stored as attribute
+        chunk_size: number of samples of a chunk of the datasets
+        compression: compression filter of the datasets (see `h5py.Group.create_dataset`)
+    """
+    header = oscar_session_data.header
+    group_name = f'{header.deviceid}/{header.sessionid}'
+    if group_name in hdf_file:
+        del hdf_file[group_name]
+    session_group = hdf_file.create_group(group_name)
+    session_group.attrs.update({'deviceid': header.deviceid,
+                                'sessionid': header.sessionid,
+                                'sfirst': header.sfirst,
+                                'slast': header.slast,
+                                'source': source})
+    for channel in oscar_session_data.data.channels:
+        if len(channel.events) == 0:
+            continue
+        name = _get_channel_name(channel.code)
+        time_utc = np.concatenate([evt.get_time() + evt.ts1 for evt in channel.events])
+        columns = {name: np.concatenate([evt.data * np.float32(evt.gain) for evt in channel.events])}
+        if any(evt.second_field for evt in channel.events):
+            columns[name + '2'] = np.concatenate([evt.data2 * np.float32(evt.gain) if evt.second_field
+                                                  else np.full(evt.evcount, np.nan, dtype=np.float32)
+                                                  for evt in channel.events])
+        order = np.argsort(time_utc, kind='stable')
+        channel_group = session_group.create_group(name)
+        channel_group.attrs['code'] = channel.code
+        chunks = (min(chunk_size, len(time_utc)),) if len(time_utc) > 0 else None
+        channel_group.create_dataset('time_utc', data=time_utc[order], chunks=chunks,
+                                     compression=compression, shuffle=compression is not None)
+        channel_group.create_dataset('time_index', data=time_utc[order][::chunk_size])
+        channel_group.attrs['chunk_size'] = chunk_size
+        for column, values in columns.items():
+            channel_group.create_dataset(column, data=values[order].astype(np.float32), chunks=chunks,
+                                         compression=compression, shuffle=compression is not None)
+
+
+def convert_to_hdf(data_path: str,
+                   hdf_filename: str,
+                   channel_ids: Optional[Iterable[int]] = None,
+                   chunk_size: int = 65536,
+                   compression: Optional[str] = 'gzip',
+                   overwrite: bool = False) -> int:
+    """
+    Convert all session files of an OSCAR data path to a HDF5 file.
+
+    Args:
+        data_path: the data path of the OSCAR data. The path must contain the directory of all CPAP machine.
+        hdf_filename: path of the HDF5 file. The file is created if it does not exist.
+        channel_ids: list of channel ids (.value, see channelID in oscar_constants.py) to convert. None means all
+            channels.
+        chunk_size: number of samples of a chunk of the datasets
+        compression: compression filter of the datasets (see `h5py.Group.create_dataset`)
+        overwrite: if False, sessions already in the HDF5 file are not converted again
+
+    Returns:
+        Number of converted sessions
+    """
+    h5py = _import_h5py()
+    sources = set()
+    nb_converted = 0
+    with h5py.File(hdf_filename, 'a') as hdf_file:
+        if not overwrite:
+            for device_group in hdf_file.values():
+                sources.update(session_group.attrs['source'] for session_group in device_group.values())
+        for filename in list_session_files(data_path):
+            # sources are absolute paths, so a data path given relatively or absolutely is converted once
+            filename = os.path.abspath(filename)
+            if filename in sources:
+                continue
+            oscar_session_data = load_session(filename, use_mmap=True, channels=channel_ids)
+            write_session_to_hdf(oscar_session_data, hdf_file, source=filename, chunk_size=chunk_size,
+                                 compression=compression)
+            nb_converted += 1
+    return nb_converted
+
+
+def list_hdf_sessions(hdf_filename: str) -> pd.DataFrame:
+    """
+    List the sessions of a HDF5 file created by `convert_to_hdf`.
+
+    Args:
+        hdf_filename: path of the HDF5 file
+
+    Returns:
+        A dataframe with the columns ['deviceid', 'sessionid', 'sfirst', 'slast', 'source', 'channels'] sorted by
+        'sfirst'
+    """
+    h5py = _import_h5py()
+    rows = []
+    with h5py.File(hdf_filename, 'r') as hdf_file:
+        for device_group in hdf_file.values():
+            for session_group in device_group.values():
+                row = {key: session_group.attrs[key] for key in ['deviceid', 'sessionid', 'sfirst', 'slast', 'source']}
+                row['channels'] = [channel_group.attrs['code'] for channel_group in session_group.values()]
+                rows.append(row)
+    return pd.DataFrame(rows, columns=['deviceid', 'sessionid', 'sfirst', 'slast', 'source', 'channels']) \
+        .sort_values('sfirst', ignore_index=True)
+
+
+def _find_position(channel_group, time_ms: int) -> int:
+    """ Find the position of the first sample at or after `time_ms` reading only `time_index` and one chunk."""
+    time_index = channel_group['time_index'][()]
+    chunk_size = int(channel_group.attrs['chunk_size'])
+    chunk_num = max(int(np.searchsorted(time_index, time_ms)) - 1, 0)
+    chunk = channel_group['time_utc'][chunk_num * chunk_size:(chunk_num + 1) * chunk_size]
+    return chunk_num * chunk_size + int(np.searchsorted(chunk, time_ms))
+
+
+def read_hdf_channel(hdf_filename: str,
+                     deviceid: int,
+                     sessionid: int,
+                     channel_id: int,
+                     start: Optional[int] = None,
+                     end: Optional[int] = None) -> pd.DataFrame:
+    """
+    Read a time range of a channel of one session from a HDF5 file created by `convert_to_hdf`.
+    Only the chunks containing the time range are read.
+
+    Args:
+        hdf_filename: path of the HDF5 file
+        deviceid: device id of the session
+        sessionid: session id of the session
+        channel_id: channel id (.value, see channelID in oscar_constants.py)
+        start: beginning of the time range (included) in milliseconds since epoch. None means the beginning of the
+            session
+        end: end of the time range (excluded) in milliseconds since epoch. None means the end of the session
+
+    Returns:
+        A dataframe with the same columns as `event_data_to_dataframe` for one channel : ["time_utc", ChannelID text,
+        (ChannelID text + "2")]. If the channel is not in the session, return an empty dataframe containing one
+        column named 'no_channel'
+    """
+    h5py = _import_h5py()
+    name = _get_channel_name(channel_id)
+    with h5py.File(hdf_filename, 'r') as hdf_file:
+        group_name = f'{deviceid}/{sessionid}/{name}'
+        if group_name not in hdf_file:
+            return pd.DataFrame(columns=['no_channel'])
+        channel_group = hdf_file[group_name]
+        begin_position = 0 if start is None else _find_position(channel_group, start)
+        end_position = len(channel_group['time_utc']) if end is None else _find_position(channel_group, end)
+        df = pd.DataFrame({'time_utc': pd.to_datetime(channel_group['time_utc'][begin_position:end_position],
+                                                      unit='ms', utc=True)})
+        for column in [name, name + '2']:
+            if column in channel_group:
+                df[column] = channel_group[column][begin_position:end_position]
+    return df
+
+
+def read_hdf_channels(hdf_filename: str,
+                      deviceid: int,
+                      sessionid: int,
+                      channel_ids: List[int],
+                      start: Optional[int] = None,
+                      end: Optional[int] = None) -> pd.DataFrame:
+    """
+    Read a time range of several channels of one session from a HDF5 file created by `convert_to_hdf`.
+    Channels are merged on 'time_utc' as in `event_data_to_dataframe`.
+
+    Args:
+        hdf_filename: path of the HDF5 file
+        deviceid: device id of the session
+        sessionid: session id of the session
+        channel_ids: list of channel ids (.value, see channelID in oscar_constants.py)
+        start: beginning of the time range (included) in milliseconds since epoch. None means no limit.
+        end: end of the time range (excluded) in milliseconds since epoch. None means no limit.
+
+    Returns:
+        A dataframe with the columns ["time_utc", ChannelID text, ...] or an empty dataframe containing one
+        column named 'no_channel' if no channel is found
+    """
+    global_df = pd.DataFrame(columns=['no_channel'])
+    for channel_id in channel_ids:
+        df = read_hdf_channel(hdf_filename, deviceid, sessionid, channel_id, start, end)
+        if 'no_channel' in df.columns:
+            continue
+        if 'no_channel' in global_df.columns:
+            global_df = df
+        else:
+            global_df = pd.merge(global_df, df, on='time_utc', how='outer')
+    return global_df
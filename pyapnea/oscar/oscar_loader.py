@@ -1,5 +1,17 @@
+import mmap
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Optional, List
+
+import numpy as np
+
 from .data_structure import OSCARSessionHeader, OSCARSession, OSCARSessionData, OSCARSessionChannel, OSCARSessionEvent
-from ..base_functions import unpack
+from ..base_functions import unpack, unpack_array
+from ..profiling import profile_stage
 
 
 def read_session_header(buffer: bytes, position: int) -> tuple[int, OSCARSessionHeader]:
@@ -13,24 +25,27 @@ def read_session_header(buffer: bytes, position: int) -> tuple[int, OSCARSession
     Returns:
         New position after header data in buffer and an `OSCARSessionHeader` data structure
     """
-    header_data = OSCARSessionHeader()
-    position, (magicnum, version, typ, machid, sessid, s_first, s_last) = unpack(buffer, 'IHHIIqq', position)
-    header_data.magicnumber = magicnum
-    header_data.version = version
-    header_data.filetype = typ
-    header_data.deviceid = machid
-    header_data.sessionid = sessid
-    header_data.sfirst = s_first
-    header_data.slast = s_last
-
-    if version >= 10:
-        position, (compmethod, machtype, datasize, crc16) = unpack(buffer, 'HHIH', position)
-        header_data.compmethod = compmethod
-        header_data.machtype = machtype
-        header_data.datasize = datasize
-        header_data.crc16 = crc16
-    else:
-        print('VERSION NOT SUPPORTED')
+    with profile_stage('oscar_loader.header') as stage:
+        start_position = position
+        header_data = OSCARSessionHeader()
+        position, (magicnum, version, typ, machid, sessid, s_first, s_last) = unpack(buffer, 'IHHIIqq', position)
+        header_data.magicnumber = magicnum
+        header_data.version = version
+        header_data.filetype = typ
+        header_data.deviceid = machid
+        header_data.sessionid = sessid
+        header_data.sfirst = s_first
+        header_data.slast = s_last
+
+        if version >= 10:
+            position, (compmethod, machtype, datasize, crc16) = unpack(buffer, 'HHIH', position)
+            header_data.compmethod = compmethod
+            header_data.machtype = machtype
+            header_data.datasize = datasize
+            header_data.crc16 = crc16
+        else:
+            print('VERSION NOT SUPPORTED')
+        stage.nbytes = position - start_position
 
     return position, header_data
 
@@ -118,70 +133,224 @@ def read_channel_data(buffer: bytes,
         New position after the channel data and the OSCARSessionChannel data structure
     """
     channel_data = data_data.channels[channel_num]
-    for evt_id in range(channel_data.size2):
-        event_data = channel_data.events[evt_id]
-        # 's' is not correct since it interprets as char
-        position, data = unpack(buffer, 'h' * event_data.evcount, position)
-        event_data.data = list(data)
-        if event_data.second_field:
-            position, data2 = unpack(buffer, 'h' * event_data.evcount, position)
-            event_data.data2 = list(data2)
-        if event_data.t8 != 0:
-            position, time_data = unpack(buffer, 'I' * event_data.evcount, position)
-            event_data.time = list(time_data)
+    with profile_stage('oscar_loader.decode') as stage:
+        start_position = position
+        for evt_id in range(channel_data.size2):
+            event_data = channel_data.events[evt_id]
+            position, event_data.data = unpack_array(buffer, np.int16, event_data.evcount, position)
+            if event_data.second_field:
+                position, event_data.data2 = unpack_array(buffer, np.int16, event_data.evcount, position)
+            if event_data.t8 != 0:
+                position, event_data.time = unpack_array(buffer, np.uint32, event_data.evcount, position)
+        stage.nbytes = position - start_position
     return position, channel_data
 
 
-def read_session_data(buffer: bytes, position: int) -> tuple[int, OSCARSessionData]:
+def get_event_data_size(event_data: OSCARSessionEvent) -> int:
+    """
+    Compute the size in bytes of the data of one event from its metadata.
+
+    Args:
+        event_data: OSCARSessionEvent data structure filled with the event metadata
+
+    Returns:
+        Number of bytes used by `data`, `data2` (if any) and `time` (if any) of the event in the session data
+    """
+    size = event_data.evcount * np.dtype(np.int16).itemsize
+    if event_data.second_field:
+        size += event_data.evcount * np.dtype(np.int16).itemsize
+    if event_data.t8 != 0:
+        size += event_data.evcount * np.dtype(np.uint32).itemsize
+    return size
+
+
+def get_channel_data_size(channel_data: OSCARSessionChannel) -> int:
+    """
+    Compute the size in bytes of the data of one channel from its metadata.
+
+    Args:
+        channel_data: OSCARSessionChannel data structure filled with the channel metadata
+
+    Returns:
+        Number of bytes used by the data of the channel in the session data
+    """
+    return sum(get_event_data_size(event_data) for event_data in channel_data.events)
+
+
+def get_event_data_positions(data_data: OSCARSessionData, position: int) -> dict[int, list[int]]:
+    """
+    Compute the position of the data of each event from the channel metadata. The data of channels are stored one
+    after the other, in the order of the metadata.
+
+    Args:
+        data_data: OSCARSessionData structure filled with the metadata of all channels
+        position: position of the first channel data (see `read_session_metadata`)
+
+    Returns:
+        A dictionary channel id -> list of positions of the `data` of each event of the channel. `data2` (if any)
+        and `time` (if any) follow `data`.
+    """
+    data_positions = {}
+    for channel_data in data_data.channels:
+        data_positions[channel_data.code] = []
+        for event_data in channel_data.events:
+            data_positions[channel_data.code].append(position)
+            position += get_event_data_size(event_data)
+    return data_positions
+
+
+def read_session_metadata(buffer: bytes, position: int) -> tuple[int, OSCARSessionData]:
+    """
+    Read the metadata of all channels of an OSCAR session file, without reading the channel data.
+
+    Args:
+        buffer: buffer containing the session data
+        position: position of the session data in the buffer
+
+    Returns:
+        New position after the metadata (i.e. position of the first channel data) and an OSCARSessionData data
+        structure where events have no data
+    """
+    with profile_stage('oscar_loader.metadata') as stage:
+        start_position = position
+        data_data = OSCARSessionData()
+        position, (mcsize,) = unpack(buffer, 'h', position)
+        data_data.mcsize = mcsize
+        for c in range(mcsize):
+            position, channel_data = read_channel_metadata(buffer, position)
+            data_data.channels.append(channel_data)
+        stage.nbytes = position - start_position
+    return position, data_data
+
+
+def read_session_data(buffer: bytes,
+                      position: int,
+                      channels: Optional[Iterable[int]] = None) -> tuple[int, OSCARSessionData]:
     """
     Read the session data of an OSCAR session file.
 
     Args:
         buffer: buffer containing the session data
         position: position of the session data in the buffer
+        channels: list of channel ids (.value, see channelID in oscar_constants.py) to decode. Data of other channels
+            are skipped and these channels are not kept in the result (`mcsize` is the number of kept channels).
+            None means all channels are decoded.
 
     Returns:
         New position after session data in buffer and an OSCARSessionData data structure
     """
-    data_data = OSCARSessionData()
-    position, (mcsize,) = unpack(buffer, 'h', position)
-    data_data.mcsize = mcsize
+    position, data_data = read_session_metadata(buffer, position)
+    mcsize = data_data.mcsize
+    if channels is not None:
+        channels = set(channels)
     for c in range(mcsize):
-        position, channel_data = read_channel_metadata(buffer, position)
-        data_data.channels.append(channel_data)
-    for c in range(mcsize):
-        position, channel_data = read_channel_data(buffer, position, data_data, c)
+        if channels is None or data_data.channels[c].code in channels:
+            position, channel_data = read_channel_data(buffer, position, data_data, c)
+        else:
+            position += get_channel_data_size(data_data.channels[c])
+    if channels is not None:
+        data_data.channels = [channel_data for channel_data in data_data.channels if channel_data.code in channels]
+        data_data.mcsize = len(data_data.channels)
     return position, data_data
 
 
-def read_session(buffer: bytes, position: int) -> tuple[int, OSCARSession]:
+def decompress_session_data(buffer: bytes, datasize: int, chunk_size: int = 1 << 16) -> bytearray:
+    """
+    Decompress the session data of a compressed OSCAR session file. OSCAR compresses the session data with
+    Qt qCompress: 4 bytes (big-endian) containing the uncompressed size followed by a zlib stream.
+    The decompression is incremental (`chunk_size` bytes at a time) into a buffer allocated once from `datasize`.
+
+    Args:
+        buffer: buffer containing the compressed session data (after the header)
+        datasize: size of the uncompressed session data (see `OSCARSessionHeader`)
+        chunk_size: maximum size of compressed and decompressed chunks
+
+    Returns:
+        The uncompressed session data
+    """
+    with profile_stage('oscar_loader.decompress') as stage:
+        decompressor = zlib.decompressobj()
+        result = bytearray(datasize)
+        view = memoryview(buffer)
+        out_position = 0
+        for in_position in range(4, len(view), chunk_size):
+            data = view[in_position:in_position + chunk_size]
+            while len(data) > 0 and not decompressor.eof:
+                chunk = decompressor.decompress(data, chunk_size)
+                # assigning after the end of a bytearray extends it if datasize is wrong
+                result[out_position:out_position + len(chunk)] = chunk
+                out_position += len(chunk)
+                data = decompressor.unconsumed_tail
+        chunk = decompressor.flush()
+        result[out_position:out_position + len(chunk)] = chunk
+        out_position += len(chunk)
+        del result[out_position:]
+        stage.nbytes = out_position
+    return result
+
+
+def _decompress_session_metadata(buffer: bytes, chunk_size: int = 1 << 16) -> OSCARSessionData:
+    """
+    Read the channel metadata at the beginning of compressed session data (see `decompress_session_data`),
+    decompressing `chunk_size` bytes at a time until the metadata are complete. The samples are not decompressed.
+    """
+    decompressor = zlib.decompressobj()
+    view = memoryview(buffer)
+    databytes = bytearray()
+    in_position = 4
+    while True:
+        try:
+            return read_session_metadata(databytes, 0)[1]
+        except struct.error:
+            pass
+        with profile_stage('oscar_loader.decompress') as stage:
+            chunk = b''
+            while len(chunk) == 0 and not decompressor.eof:
+                data = decompressor.unconsumed_tail
+                if len(data) == 0:
+                    if in_position >= len(view):
+                        break
+                    data = view[in_position:in_position + chunk_size]
+                    in_position += len(data)
+                chunk = decompressor.decompress(data, chunk_size)
+            stage.nbytes = len(chunk)
+        if len(chunk) == 0:
+            raise EOFError('unexpected end of the compressed session data')
+        databytes += chunk
+
+
+def read_session(buffer: bytes,
+                 position: int,
+                 channels: Optional[Iterable[int]] = None) -> tuple[int, OSCARSession]:
     """
     Read a session of an OSCAR session file. Only support version >= 10 at the moment.
+    The buffer is never copied: sample arrays of the session are views on `buffer`.
 
     Args:
         buffer: buffer containing the session
         position: position of the session in the buffer
+        channels: list of channel ids to decode (see `read_session_data`). None means all channels are decoded.
 
     Returns:
         New position after session in buffer and an OSCARSession data structure
     """
     databytes = None
-    compmethod = 0
     # Header
     position, oscar_session_header = read_session_header(buffer, position)
 
-    temp = buffer[position:]
+    # memoryview slicing avoids a copy of the whole session data
+    temp = memoryview(buffer)[position:]
 
     if oscar_session_header.version >= 10:
-        if compmethod > 0:
-            print('COMPRESSION NOT SUPPORTED YET')
+        if oscar_session_header.compmethod > 0:
+            databytes = decompress_session_data(temp, oscar_session_header.datasize)
         else:
             databytes = temp
     else:
         print('VERSION NOT SUPPORTED')
 
     dataposition = 0
-    dataposition, oscar_session_data = read_session_data(databytes, dataposition)
+    dataposition, oscar_session_data = read_session_data(databytes, dataposition, channels)
 
     oscar_session = OSCARSession()
     oscar_session.header = oscar_session_header
@@ -190,18 +359,202 @@ def read_session(buffer: bytes, position: int) -> tuple[int, OSCARSession]:
     return position, oscar_session
 
 
-def load_session(filename: str) -> OSCARSession:
+def load_session(filename: str,
+                 use_mmap: bool = False,
+                 channels: Optional[Iterable[int]] = None) -> OSCARSession:
     """
     Load an OSCAR session file (.001)
 
     Args:
         filename: full path of the file including filename
+        use_mmap: if True, the file is memory-mapped instead of being read in memory. Sample arrays of the session
+            are then read-only views on the mapping: pages are loaded on first access and shared with the page cache.
+            The mapping is released when the session arrays are no longer referenced. Use `numpy.array(...)` on an
+            array to get a copy.
+        channels: list of channel ids (.value, see channelID in oscar_constants.py) to decode. Data of other
+            channels are skipped without being decoded. None means all channels are decoded.
 
     Returns:
         An OSCARSession instance containing data from file
     """
     with open(filename, mode='rb') as file:
-        data = file.read()
+        with profile_stage('oscar_loader.read_file') as stage:
+            if use_mmap:
+                # the mapping stays valid after the file is closed
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = file.read()
+            stage.nbytes = len(data)
         position = 0
-        position, oscar_session_data = read_session(data, position)
+        position, oscar_session_data = read_session(data, position, channels)
     return oscar_session_data
+
+
+def _load_session_to_shared_memory(filename: str,
+                                   channels: Optional[Iterable[int]]) -> tuple[OSCARSession, Optional[str], int]:
+    """
+    Load a session and move its sample arrays to a shared memory block, with the same layout as the channel data in
+    a session file. The returned session has empty arrays and can be pickled cheaply.
+
+    Returns:
+        The session without samples, the name of the shared memory block (None if there is no sample) and the size
+        of the samples in the block
+    """
+    oscar_session_data = load_session(filename, use_mmap=True, channels=channels)
+    size = sum(get_channel_data_size(channel_data) for channel_data in oscar_session_data.data.channels)
+    if size == 0:
+        return oscar_session_data, None, 0
+    shm = SharedMemory(create=True, size=size)
+    # the parent process is responsible for unlinking the block
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    position = 0
+    for channel_data in oscar_session_data.data.channels:
+        for event_data in channel_data.events:
+            for name in ['data', 'data2', 'time']:
+                array = getattr(event_data, name)
+                shm.buf[position:position + array.nbytes] = memoryview(array).cast('B')
+                position += array.nbytes
+                setattr(event_data, name, np.empty(0, dtype=array.dtype))
+    shm.close()
+    return oscar_session_data, shm.name, size
+
+
+class _SharedMemoryBuffer:
+
+    def __init__(self, shm_name: str, size: int):
+        """
+        The first `size` bytes of a shared memory block, as an array interface. Arrays built on it keep the block
+        mapped until they are no longer referenced. The block is unlinked at once: its name is released but the
+        mapping stays valid.
+        """
+        self.shm = SharedMemory(name=shm_name)
+        try:
+            # the temporary array gives the address of the mapping and is released at once, so the block can be
+            # closed when this object is collected
+            address = np.frombuffer(self.shm.buf, dtype=np.uint8, count=size).ctypes.data
+        finally:
+            self.shm.unlink()
+        self.__array_interface__ = {'data': (address, False), 'shape': (size,), 'typestr': '|u1', 'version': 3}
+
+
+def _unlink_shared_memory(shm_name: str):
+    shm = SharedMemory(name=shm_name)
+    shm.close()
+    shm.unlink()
+
+
+def load_sessions(filenames: Iterable[str],
+                  workers: Optional[int] = None,
+                  channels: Optional[Iterable[int]] = None) -> List[OSCARSession]:
+    """
+    Load several OSCAR session files (.001) in parallel with a pool of processes.
+    Samples are sent back from the processes through shared memory instead of being pickled, and the sample arrays
+    of the sessions are views on the shared memory, without copy.
+
+    Args:
+        filenames: full paths of the files including filename
+        workers: number of processes. None means the number of CPUs. 1 loads the files in the current process.
+        channels: list of channel ids (.value, see channelID in oscar_constants.py) to decode. None means all
+            channels are decoded.
+
+    Returns:
+        A list of OSCARSession instances, in the same order as `filenames`
+    """
+    filenames = list(filenames)
+    if workers == 1:
+        return [load_session(filename, channels=channels) for filename in filenames]
+
+    list_sessions = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_load_session_to_shared_memory, filename, channels) for filename in filenames]
+        nb_attached = 0
+        try:
+            for future in futures:
+                oscar_session_data, shm_name, size = future.result()
+                nb_attached += 1
+                if shm_name is not None:
+                    # sample arrays are views on the shared memory block, no copy is done
+                    buffer = np.asarray(_SharedMemoryBuffer(shm_name, size))
+                    position = 0
+                    for c in range(len(oscar_session_data.data.channels)):
+                        position, channel_data = read_channel_data(buffer, position, oscar_session_data.data, c)
+                list_sessions.append(oscar_session_data)
+        finally:
+            # after an error, the blocks of the sessions not attached yet are unlinked
+            for future in futures[nb_attached:]:
+                if future.cancel() or future.exception() is not None:
+                    continue
+                _, shm_name, _ = future.result()
+                if shm_name is not None:
+                    _unlink_shared_memory(shm_name)
+    return list_sessions
+
+
+def load_session_layout(filename: str) -> tuple[OSCARSession, Optional[dict[int, list[int]]]]:
+    """
+    Load the header and the channel metadata of an OSCAR session file (.001) and compute the position in the file
+    of the data of each event, without reading the channel data.
+    The file is memory-mapped so the pages containing channel data are never read. For compressed files, only the
+    beginning of the session data containing the metadata is decompressed.
+
+    Args:
+        filename: full path of the file including filename
+
+    Returns:
+        An OSCARSession instance containing the header and the metadata of all channels (events have no data) and
+        a dictionary channel id -> list of positions in the file of the `data` of each event of the channel. The
+        dictionary is None for compressed files since their data can not be read at a position of the file.
+    """
+    data_positions = None
+    with open(filename, mode='rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position, oscar_session_header = read_session_header(data, 0)
+            if oscar_session_header.version < 10:
+                print('VERSION NOT SUPPORTED')
+            if oscar_session_header.compmethod > 0:
+                # metadata are at the beginning of the compressed data, the samples are not decompressed
+                with memoryview(data)[position:] as temp:
+                    oscar_session_data = _decompress_session_metadata(temp)
+            else:
+                position, oscar_session_data = read_session_metadata(data, position)
+                data_positions = get_event_data_positions(oscar_session_data, position)
+
+    oscar_session = OSCARSession()
+    oscar_session.header = oscar_session_header
+    oscar_session.data = oscar_session_data
+    return oscar_session, data_positions
+
+
+def load_session_metadata(filename: str) -> OSCARSession:
+    """
+    Load the header and the channel metadata of an OSCAR session file (.001), without reading the channel data.
+    The file is memory-mapped so the pages containing channel data are never read. For compressed files, only the
+    beginning of the session data containing the metadata is decompressed.
+
+    Args:
+        filename: full path of the file including filename
+
+    Returns:
+        An OSCARSession instance containing the header and the metadata of all channels. Events have no data.
+    """
+    return load_session_layout(filename)[0]
+
+
+def list_session_files(data_path: str) -> list[str]:
+    """
+    List the session files of all machines of an OSCAR data path.
+    Session files are expected in `data_path/<machine>/Events/`.
+
+    Args:
+        data_path: the data path of the OSCAR data. The path must contain the directory of all CPAP machine.
+
+    Returns:
+        Sorted list of full paths of the session files
+    """
+    list_files = []
+    for machine in os.listdir(data_path):
+        events_path = os.path.join(data_path, machine, 'Events')
+        if os.path.isdir(events_path):
+            list_files.extend(os.path.join(events_path, f) for f in os.listdir(events_path)
+                              if os.path.isfile(os.path.join(events_path, f)))
+    return sorted(list_files)
@@ -0,0 +1,198 @@
+"""
+Incremental parsing of OSCAR session files from binary file-like objects (files, pipes, sockets, archive members).
+
+The stream is read in chunks of bounded size and parsed as it arrives: the header, then the metadata of each channel,
+then the samples of each event in chunks of at most `chunk_size` bytes. Compressed session data are decompressed
+incrementally. The memory used by the parser depends on the chunk size, not on the size of the session.
+"""
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from .data_structure import OSCARSessionHeader, OSCARSession, OSCARSessionData, OSCARSessionChannel
+from .oscar_loader import read_session_header, read_channel_metadata
+from ..base_functions import unpack
+
+
+@dataclass(slots=True)
+class OSCARSampleChunk:
+    """
+    Consecutive samples of one array (`name` is 'data', 'data2' or 'time') of an event: `values` are the samples
+    `start` to `start + len(values)` of the array of the event number `event` of the channel `code`.
+    """
+    code: int = 0
+    event: int = 0
+    name: str = 'data'
+    start: int = 0
+    values: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int16))
+
+
+class _StreamReader:
+
+    def __init__(self, file: BinaryIO, chunk_size: int):
+        """
+        Buffer of the bytes of a binary stream not parsed yet, filled `chunk_size` bytes at a time. After
+        `start_decompression`, the buffer is filled with decompressed data.
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.decompressor = None
+        self.compressed = b''
+
+    def start_decompression(self):
+        """ The rest of the stream is compressed with Qt qCompress: 4 bytes (uncompressed size) and a zlib stream."""
+        self.read(4)
+        self.decompressor = zlib.decompressobj()
+        self.compressed = bytes(self.buffer)
+        self.buffer.clear()
+
+    def _read_chunk(self) -> bytes:
+        if self.decompressor is None:
+            return self.file.read(self.chunk_size) or b''
+        while not self.decompressor.eof:
+            if len(self.compressed) == 0:
+                self.compressed = self.file.read(self.chunk_size) or b''
+                if len(self.compressed) == 0:
+                    return self.decompressor.flush()
+            chunk = self.decompressor.decompress(self.compressed, self.chunk_size)
+            self.compressed = self.decompressor.unconsumed_tail
+            if len(chunk) > 0:
+                return chunk
+        return b''
+
+    def fill(self):
+        """ Add the next chunk of the stream to the buffer."""
+        chunk = self._read_chunk()
+        if len(chunk) == 0:
+            raise EOFError('unexpected end of the session stream')
+        self.buffer += chunk
+
+    def read(self, size: int) -> bytes:
+        """ Read `size` bytes from the stream."""
+        while len(self.buffer) < size:
+            self.fill()
+        result = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return result
+
+    def skip(self, size: int):
+        """ Skip `size` bytes of the stream, `chunk_size` bytes at a time."""
+        while size > 0:
+            if len(self.buffer) == 0:
+                self.fill()
+            skipped = min(size, len(self.buffer))
+            del self.buffer[:skipped]
+            size -= skipped
+
+    def parse(self, read_function: Callable[[Any, int], tuple[int, Any]]) -> Any:
+        """
+        Parse a structure of unknown size with a `read_*` function of `oscar_loader` (buffer, position) ->
+        (position, result). The buffer is filled until the structure is complete.
+        """
+        while True:
+            try:
+                position, result = read_function(self.buffer, 0)
+            except struct.error:
+                self.fill()
+                continue
+            del self.buffer[:position]
+            return result
+
+
+def iter_session_stream(file: BinaryIO,
+                        channels: Optional[Iterable[int]] = None,
+                        chunk_size: int = 1 << 16) -> Iterator[Union[OSCARSessionHeader, OSCARSessionData,
+                                                                      OSCARSessionChannel, OSCARSampleChunk]]:
+    """
+    Parse an OSCAR session incrementally from a binary file-like object, only `read(size)` is used. Only support
+    version >= 10 at the moment.
+
+    Args:
+        file: binary file-like object positioned at the beginning of the session
+        channels: list of channel ids (.value, see channelID in oscar_constants.py) to decode. Metadata and samples of
+            other channels are skipped. None means all channels are decoded.
+        chunk_size: number of bytes read from the stream at a time, and maximum size of the samples of a
+            `OSCARSampleChunk`
+
+    Returns:
+        An iterator of the parts of the session as they are read: the `OSCARSessionHeader`, an `OSCARSessionData`
+        with the number of channels of the file (`mcsize`, no channel), an `OSCARSessionChannel` for each channel
+        (metadata only, events have no data), then the samples of each event of each channel as
+        `OSCARSampleChunk` (read-only arrays), in the order of the file
+    """
+    reader = _StreamReader(file, chunk_size)
+    oscar_session_header = reader.parse(read_session_header)
+    yield oscar_session_header
+    if oscar_session_header.compmethod > 0:
+        reader.start_decompression()
+
+    if channels is not None:
+        channels = set(channels)
+    mcsize = reader.parse(lambda buffer, position: unpack(buffer, 'h', position))[0]
+    yield OSCARSessionData(mcsize=mcsize)
+    list_channels = []
+    for c in range(mcsize):
+        channel_data = reader.parse(read_channel_metadata)
+        list_channels.append(channel_data)
+        if channels is None or channel_data.code in channels:
+            yield channel_data
+
+    for channel_data in list_channels:
+        for evt_id, event_data in enumerate(channel_data.events):
+            arrays = [('data', np.int16)]
+            if event_data.second_field:
+                arrays.append(('data2', np.int16))
+            if event_data.t8 != 0:
+                arrays.append(('time', np.uint32))
+            for name, dtype in arrays:
+                itemsize = np.dtype(dtype).itemsize
+                if channels is not None and channel_data.code not in channels:
+                    reader.skip(event_data.evcount * itemsize)
+                    continue
+                samples_per_chunk = max(chunk_size // itemsize, 1)
+                for start in range(0, event_data.evcount, samples_per_chunk):
+                    count = min(samples_per_chunk, event_data.evcount - start)
+                    values = np.frombuffer(reader.read(count * itemsize), dtype=dtype)
+                    yield OSCARSampleChunk(code=channel_data.code, event=evt_id, name=name, start=start,
+                                           values=values)
+
+
+def read_session_stream(file: BinaryIO,
+                        channels: Optional[Iterable[int]] = None,
+                        chunk_size: int = 1 << 16) -> OSCARSession:
+    """
+    Read an OSCAR session from a binary file-like object (see `iter_session_stream`), without reading the whole
+    stream in memory first.
+
+    Args:
+        file: binary file-like object positioned at the beginning of the session
+        channels: list of channel ids to decode. None means all channels are decoded.
+        chunk_size: number of bytes read from the stream at a time
+
+    Returns:
+        An OSCARSession instance containing data from the stream
+    """
+    oscar_session = OSCARSession()
+    channels_by_code = {}
+    for item in iter_session_stream(file, channels, chunk_size):
+        if isinstance(item, OSCARSampleChunk):
+            event_data = channels_by_code[item.code].events[item.event]
+            array = getattr(event_data, item.name)
+            if item.start == 0:
+                array = np.empty(event_data.evcount, dtype=item.values.dtype)
+                setattr(event_data, item.name, array)
+            array[item.start:item.start + len(item.values)] = item.values
+        elif isinstance(item, OSCARSessionChannel):
+            oscar_session.data.channels.append(item)
+            channels_by_code[item.code] = item
+        elif isinstance(item, OSCARSessionData):
+            oscar_session.data = item
+        else:
+            oscar_session.header = item
+    # as `read_session_data`, the number of channels of the session when some channels are skipped
+    oscar_session.data.mcsize = len(oscar_session.data.channels)
+    return oscar_session
@@ -0,0 +1,263 @@
+import struct
+import zlib
+from dataclasses import replace
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from .data_structure import OSCARSessionHeader, OSCARSession, OSCARSessionData, OSCARSessionChannel, OSCARSessionEvent
+from .oscar_loader import get_channel_data_size
+
+
+def write_session_header(oscar_session_header: OSCARSessionHeader) -> bytes:
+    """
+    Write the header of an OSCAR session file (inverse of `read_session_header`). Only support version >= 10 at the
+    moment.
+
+    Args:
+        oscar_session_header: OSCARSessionHeader data structure
+
+    Returns:
+        The header data
+    """
+    header = oscar_session_header
+    return struct.pack('IHHIIqq', header.magicnumber, header.version, header.filetype, header.deviceid,
+                       header.sessionid, header.sfirst, header.slast) + \
+        struct.pack('HHIH', header.compmethod, header.machtype, header.datasize, header.crc16)
+
+
+def _get_len_dim(event_data: OSCARSessionEvent) -> int:
+    """ Length of the unit in bytes, -1 for a null string (as read by `read_event_metadata`)."""
+    if event_data.len_dim == -1 and event_data.dim == '':
+        return -1
+    return len(event_data.dim.encode('UTF-16-LE'))
+
+
+def write_event_metadata(event_data: OSCARSessionEvent) -> bytes:
+    """
+    Write one event metadata of an OSCAR session file (inverse of `read_event_metadata`).
+
+    Args:
+        event_data: OSCARSessionEvent data structure
+
+    Returns:
+        The event metadata
+    """
+    len_dim = _get_len_dim(event_data)
+    result = struct.pack('<qqiBdddddi', event_data.ts1, event_data.ts2, event_data.evcount, event_data.t8,
+                         event_data.rate, event_data.gain, event_data.offset, event_data.mn, event_data.mx, len_dim)
+    if len_dim != -1:
+        result += event_data.dim.encode('UTF-16-LE')
+    result += struct.pack('?', event_data.second_field)
+    if event_data.second_field:
+        result += struct.pack('ff', event_data.mn2, event_data.mx2)
+    return result
+
+
+def write_channel_metadata(channel_data: OSCARSessionChannel) -> bytes:
+    """
+    Write the metadata of a channel of an OSCAR session file (inverse of `read_channel_metadata`). The number of
+    events is the length of `channel_data.events`.
+
+    Args:
+        channel_data: OSCARSessionChannel data structure
+
+    Returns:
+        The channel metadata
+    """
+    return struct.pack('I', channel_data.code) + struct.pack('h', len(channel_data.events)) + \
+        b''.join(write_event_metadata(event_data) for event_data in channel_data.events)
+
+
+def _check_event_data(event_data: OSCARSessionEvent):
+    """ Check that the sample arrays of an event match its metadata."""
+    arrays = [('data', event_data.data)]
+    if event_data.second_field:
+        arrays.append(('data2', event_data.data2))
+    if event_data.t8 != 0:
+        arrays.append(('time', event_data.time))
+    for name, array in arrays:
+        if len(array) != event_data.evcount:
+            raise ValueError(f'event has {event_data.evcount} samples but {len(array)} values in {name}, '
+                             f'sessions loaded without samples (load_session_metadata) can not be written or trimmed')
+
+
+def _channel_data_parts(channel_data: OSCARSessionChannel) -> Iterator[memoryview]:
+    """ Buffers of the data of one channel, without copy of the sample arrays when they have the right type."""
+    for event_data in channel_data.events:
+        _check_event_data(event_data)
+        yield memoryview(np.ascontiguousarray(event_data.data, dtype=np.int16)).cast('B')
+        if event_data.second_field:
+            yield memoryview(np.ascontiguousarray(event_data.data2, dtype=np.int16)).cast('B')
+        if event_data.t8 != 0:
+            yield memoryview(np.ascontiguousarray(event_data.time, dtype=np.uint32)).cast('B')
+
+
+def write_channel_data(channel_data: OSCARSessionChannel) -> bytes:
+    """
+    Write the data of one channel of an OSCAR session file (inverse of `read_channel_data`).
+
+    Args:
+        channel_data: OSCARSessionChannel data structure with samples
+
+    Returns:
+        The channel data
+    """
+    return b''.join(_channel_data_parts(channel_data))
+
+
+def _session_data_parts(oscar_session_data: OSCARSessionData) -> Iterator[bytes]:
+    """ Buffers of the session data: the metadata of all channels then the data of all channels."""
+    yield struct.pack('h', len(oscar_session_data.channels))
+    for channel_data in oscar_session_data.channels:
+        yield write_channel_metadata(channel_data)
+    for channel_data in oscar_session_data.channels:
+        yield from _channel_data_parts(channel_data)
+
+
+def write_session_data(oscar_session_data: OSCARSessionData) -> bytes:
+    """
+    Write the session data of an OSCAR session file (inverse of `read_session_data`). The number of channels is the
+    length of `oscar_session_data.channels`, so a session loaded with only some channels is written with these
+    channels only.
+
+    Args:
+        oscar_session_data: OSCARSessionData data structure with samples
+
+    Returns:
+        The session data
+    """
+    return b''.join(_session_data_parts(oscar_session_data))
+
+
+def _get_session_data_size(oscar_session_data: OSCARSessionData) -> int:
+    """ Size of the session data computed from the metadata, after checking the sample arrays of all events."""
+    size = struct.calcsize('h')
+    for channel_data in oscar_session_data.channels:
+        for event_data in channel_data.events:
+            _check_event_data(event_data)
+        size += len(write_channel_metadata(channel_data)) + get_channel_data_size(channel_data)
+    return size
+
+
+def _compress_parts(parts: Iterable[bytes], datasize: int, level: int) -> Iterator[bytes]:
+    """ Compress buffers as Qt qCompress: 4 bytes (big-endian) containing the uncompressed size and a zlib stream."""
+    yield struct.pack('>I', datasize)
+    compressor = zlib.compressobj(level)
+    for part in parts:
+        yield compressor.compress(part)
+    yield compressor.flush()
+
+
+def _session_parts(oscar_session: OSCARSession, compress: Optional[bool], level: int) -> Iterator[bytes]:
+    """ Buffers of a session file: the header then the (compressed) session data."""
+    if compress is None:
+        compress = oscar_session.header.compmethod > 0
+    # the size is known before the data are written, so the parts are generated one at a time
+    datasize = _get_session_data_size(oscar_session.data)
+    parts = _session_data_parts(oscar_session.data)
+    header = replace(oscar_session.header, compmethod=1 if compress else 0, datasize=datasize)
+    yield write_session_header(header)
+    yield from _compress_parts(parts, datasize, level) if compress else parts
+
+
+def write_session(oscar_session: OSCARSession, compress: Optional[bool] = None, level: int = -1) -> bytes:
+    """
+    Write a session of an OSCAR session file (inverse of `read_session`). `compmethod` and `datasize` of the header
+    are set from the written data, other fields of the header are written as-is. A session read from an
+    uncompressed file is written back byte for byte.
+
+    Args:
+        oscar_session: OSCARSession data structure with samples
+        compress: if True, the session data are compressed as OSCAR does (Qt qCompress, `compmethod` 1). None means
+            compressed if the session was read from a compressed file (`header.compmethod > 0`).
+        level: zlib compression level, -1 means the default level (as qCompress)
+
+    Returns:
+        The content of the session file
+    """
+    return b''.join(_session_parts(oscar_session, compress, level))
+
+
+def save_session(oscar_session: OSCARSession, filename: str, compress: Optional[bool] = None, level: int = -1):
+    """
+    Save an OSCAR session file (.001), inverse of `load_session`. The samples are written from the session arrays
+    without building the whole file in memory (except compressed files, whose data is compressed incrementally).
+
+    Args:
+        oscar_session: OSCARSession data structure with samples
+        filename: full path of the file including filename
+        compress: if True, the session data are compressed (see `write_session`)
+        level: zlib compression level, -1 means the default level (as qCompress)
+    """
+    with open(filename, mode='wb') as file:
+        file.writelines(_session_parts(oscar_session, compress, level))
+
+
+def _trim_event(event_data: OSCARSessionEvent, start: Optional[int], end: Optional[int]) -> OSCARSessionEvent:
+    """ Keep the samples of an event in the time range [start, end[, `ts1` becomes the time of the first sample."""
+    _check_event_data(event_data)
+    times = event_data.get_time() + event_data.ts1
+    keep = np.ones(len(times), dtype=bool)
+    if start is not None:
+        keep &= times >= start
+    if end is not None:
+        keep &= times < end
+    times = times[keep]
+    data = event_data.data[keep]
+    gain = np.float32(event_data.gain)
+    result = replace(event_data, evcount=len(data), data=data,
+                     data2=event_data.data2[keep] if event_data.second_field else event_data.data2)
+    if len(data) > 0:
+        result.ts1 = int(times[0])
+        # as OSCAR: the end of a waveform is one period after its last sample
+        result.ts2 = int(times[-1]) + (int(event_data.rate) if event_data.t8 == 0 else 0)
+        result.mn = float(gain * data.min())
+        result.mx = float(gain * data.max())
+        if event_data.second_field:
+            result.mn2 = float(gain * result.data2.min())
+            result.mx2 = float(gain * result.data2.max())
+    if event_data.t8 != 0:
+        result.time = (times - result.ts1).astype(np.uint32)
+    return result
+
+
+def trim_session(oscar_session: OSCARSession,
+                 channel_ids: Optional[Iterable[int]] = None,
+                 start: Optional[int] = None,
+                 end: Optional[int] = None) -> OSCARSession:
+    """
+    Trim a session to some channels and a time range, to save a compacted copy of a session file with
+    `save_session`. Events without samples in the time range are removed.
+
+    Args:
+        oscar_session: OSCARSession data structure with samples
+        channel_ids: list of channel ids (.value, see channelID in oscar_constants.py) to keep. None means all
+            channels.
+        start: beginning of the time range (included) in milliseconds since epoch. None means no limit.
+        end: end of the time range (excluded) in milliseconds since epoch. None means no limit.
+
+    Returns:
+        A new OSCARSession. Sample arrays are shared with `oscar_session` when no time range is given.
+    """
+    if channel_ids is not None:
+        channel_ids = set(channel_ids)
+    channels = []
+    for channel_data in oscar_session.data.channels:
+        if channel_ids is not None and channel_data.code not in channel_ids:
+            continue
+        events = list(channel_data.events)
+        if start is not None or end is not None:
+            events = [event_data for event_data in (_trim_event(evt, start, end) for evt in events)
+                      if event_data.evcount > 0]
+        channels.append(OSCARSessionChannel(code=channel_data.code, size2=len(events), events=events))
+
+    header = replace(oscar_session.header)
+    if start is not None:
+        header.sfirst = max(header.sfirst, start)
+    if end is not None:
+        header.slast = min(header.slast, end)
+    result = OSCARSession()
+    result.header = header
+    result.data = OSCARSessionData(mcsize=len(channels), channels=channels)
+    return result
@@ -0,0 +1,231 @@
+"""
+Optional instrumentation of the hot paths of pyapnea: time spent, bytes processed and number of calls per stage
+(file read, header and metadata parsing, channel decoding, dataframe build and merge, annotation, dataset elements).
+
+Profiling is disabled by default and costs one function call per stage when disabled. It is enabled by
+`enable_profiling()` or by the environment variables `PYAPNEA_PROFILE=1` (counters in memory) and
+`PYAPNEA_PROFILE_DIR=<directory>` (counters of each process also written to the directory when the process exits).
+`enable_profiling` exports these variables, so processes started afterwards (e.g. DataLoader workers with the
+'spawn' start method) are profiled too.
+
+Counters are kept per process. With a multi-worker DataLoader, use an output directory and aggregate the counters
+of all processes with `load_profiles`:
+
+    enable_profiling(output_dir='profile')
+    ...  # training
+    print(format_profile(load_profiles('profile')))
+"""
+import glob
+import json
+import os
+import time
+from multiprocessing.util import Finalize
+from typing import Dict, Iterable, Optional
+
+PROFILE_ENV = 'PYAPNEA_PROFILE'
+PROFILE_DIR_ENV = 'PYAPNEA_PROFILE_DIR'
+
+_enabled = bool(os.environ.get(PROFILE_ENV)) or bool(os.environ.get(PROFILE_DIR_ENV))
+_output_dir = os.environ.get(PROFILE_DIR_ENV) or None
+# stage name -> [calls, seconds, bytes] of the current process
+_counters: Dict[str, list] = {}
+_pid = None
+
+
+class _Stage:
+    """ Context manager measuring one stage. `nbytes` can be set inside the context."""
+    __slots__ = ('name', 'nbytes', 'start')
+    enabled = True
+
+    def __init__(self, name: str, nbytes: int):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+
+class _DisabledStage:
+    """ Context manager doing nothing, returned when profiling is disabled."""
+    __slots__ = ('nbytes',)
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_DISABLED_STAGE = _DisabledStage()
+
+
+def profile_stage(name: str, nbytes: int = 0):
+    """
+    Measure a stage: `with profile_stage('name') as stage: ...`. The number of bytes processed can be given or set
+    inside the context (`stage.nbytes = ...`), use `if stage.enabled:` to skip computing it when profiling is
+    disabled.
+
+    Args:
+        name: name of the stage
+        nbytes: number of bytes processed by the stage
+
+    Returns:
+        A context manager
+    """
+    if not _enabled:
+        return _DISABLED_STAGE
+    return _Stage(name, nbytes)
+
+
+def record(name: str, seconds: float, nbytes: int = 0):
+    """
+    Add one call of a stage to the counters of the current process.
+
+    Args:
+        name: name of the stage
+        seconds: time spent in the stage
+        nbytes: number of bytes processed by the stage
+    """
+    global _pid
+    if _pid != os.getpid():
+        # first record of the process: counters inherited from a forked parent are not counted twice
+        _counters.clear()
+        _pid = os.getpid()
+        if _output_dir is not None:
+            Finalize(None, dump_profile, args=(_output_dir,), exitpriority=0)
+    counters = _counters.get(name)
+    if counters is None:
+        counters = _counters[name] = [0, 0.0, 0]
+    counters[0] += 1
+    counters[1] += seconds
+    counters[2] += nbytes
+
+
+def enable_profiling(enabled: bool = True, output_dir: Optional[str] = None):
+    """
+    Enable or disable profiling in the current process and in the processes started afterwards.
+
+    Args:
+        enabled: True to enable profiling
+        output_dir: directory where each process writes its counters when it exits (see `dump_profile`). None means
+            counters are kept in memory only.
+    """
+    global _enabled, _output_dir, _pid
+    _enabled = enabled
+    _output_dir = output_dir if enabled else None
+    # the exit handler is registered on the next record
+    _pid = None
+    _counters.clear()
+    os.environ.pop(PROFILE_ENV, None)
+    os.environ.pop(PROFILE_DIR_ENV, None)
+    if enabled:
+        os.environ[PROFILE_ENV] = '1'
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            os.environ[PROFILE_DIR_ENV] = output_dir
+
+
+def is_profiling_enabled() -> bool:
+    """
+    Returns:
+        True if profiling is enabled in the current process
+    """
+    return _enabled
+
+
+def reset_profile():
+    """ Reset the counters of the current process."""
+    _counters.clear()
+
+
+def get_profile() -> Dict[str, Dict[str, float]]:
+    """
+    Get the counters of the current process.
+
+    Returns:
+        A dictionary stage name -> {'calls', 'seconds', 'bytes'}
+    """
+    return {name: {'calls': calls, 'seconds': seconds, 'bytes': nbytes}
+            for name, (calls, seconds, nbytes) in _counters.items()}
+
+
+def merge_profiles(profiles: Iterable[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate the counters of several processes (e.g. DataLoader workers), by summing them per stage.
+
+    Args:
+        profiles: counters of each process (see `get_profile`)
+
+    Returns:
+        The aggregated counters
+    """
+    result = {}
+    for profile in profiles:
+        for name, counters in profile.items():
+            total = result.setdefault(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+            for key in total:
+                total[key] += counters[key]
+    return result
+
+
+def dump_profile(output_dir: str) -> Optional[str]:
+    """
+    Write the counters of the current process to `output_dir/profile-<pid>.json`. Called when the process exits if
+    an output directory is set.
+
+    Args:
+        output_dir: output directory
+
+    Returns:
+        The path of the file, None if there is no counter
+    """
+    if len(_counters) == 0:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f'profile-{os.getpid()}.json')
+    with open(filename, 'w') as file:
+        json.dump(get_profile(), file)
+    return filename
+
+
+def load_profiles(output_dir: str) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate the counters written by all processes in an output directory.
+
+    Args:
+        output_dir: output directory (see `enable_profiling`)
+
+    Returns:
+        The aggregated counters
+    """
+    profiles = []
+    for filename in sorted(glob.glob(os.path.join(output_dir, 'profile-*.json'))):
+        with open(filename) as file:
+            profiles.append(json.load(file))
+    return merge_profiles(profiles)
+
+
+def format_profile(profile: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    """
+    Format counters as a table sorted by time spent.
+
+    Args:
+        profile: counters (see `get_profile`). None means the counters of the current process.
+
+    Returns:
+        The table
+    """
+    profile = get_profile() if profile is None else profile
+    lines = [f'{"stage":<40} {"calls":>8} {"seconds":>10} {"MB":>10} {"MB/s":>10}']
+    for name, counters in sorted(profile.items(), key=lambda item: -item[1]['seconds']):
+        megabytes = counters['bytes'] / 1e6
+        throughput = megabytes / counters['seconds'] if counters['seconds'] > 0 else 0.0
+        lines.append(f'{name:<40} {counters["calls"]:>8} {counters["seconds"]:>10.4f} {megabytes:>10.2f} '
+                     f'{throughput:>10.1f}')
+    return '\n'.join(lines)
@@ -1 +1,19 @@
-from .raw_oscar_dataset import RawOscarDataset
\ No newline at end of file
+from ..base_functions import get_lazy_attribute
+
+# modules using torch are imported on first use of one of their names
+LAZY_NAMES = {'RawOscarDataset': '.raw_oscar_dataset',
+              'WindowedOscarDataset': '.windowed_oscar_dataset',
+              'EventWeightedSampler': '.event_weighted_sampler',
+              'IterableOscarDataset': '.iterable_oscar_dataset',
+              'LengthBucketBatchSampler': '.length_bucket_batch_sampler',
+              'pad_collate': '.length_bucket_batch_sampler'}
+
+__all__ = list(LAZY_NAMES)
+
+
+def __getattr__(name):
+    return get_lazy_attribute(__name__, LAZY_NAMES, name)
+
+
+def __dir__():
+    return __all__
@@ -0,0 +1,59 @@
+from typing import Optional, Sequence
+
+import numpy as np
+import torch
+from torch.utils.data import WeightedRandomSampler
+
+
+class EventWeightedSampler(WeightedRandomSampler):
+
+    def __init__(self,
+                 contains_event: Sequence[bool],
+                 positive_ratio: float = 0.5,
+                 num_samples: Optional[int] = None,
+                 replacement: bool = True,
+                 generator: Optional[torch.Generator] = None):
+        """
+        Sampler drawing elements containing an apnea event (positives) with a given probability, to oversample the
+        rare positive elements. It only needs to know which elements contain an event, so elements are never loaded
+        to make sampling decisions. Like any sampler, it runs in the main process and works with a `DataLoader`
+        with several workers.
+
+        Args:
+            contains_event: for each element of the dataset, True if it contains at least one event
+            positive_ratio: probability to draw a positive element. If the dataset has no positive (or no negative)
+                element, elements are drawn uniformly.
+            num_samples: number of elements drawn per epoch. None means the length of the dataset.
+            replacement: if True, elements are drawn with replacement
+            generator: generator used for sampling
+        """
+        if not 0 <= positive_ratio <= 1:
+            raise ValueError(f'positive_ratio must be between 0 and 1, got {positive_ratio}')
+        contains_event = np.asarray(contains_event, dtype=bool)
+        nb_positives = int(contains_event.sum())
+        nb_negatives = len(contains_event) - nb_positives
+        if nb_positives == 0 or nb_negatives == 0:
+            weights = np.ones(len(contains_event))
+        else:
+            weights = np.where(contains_event, positive_ratio / nb_positives, (1 - positive_ratio) / nb_negatives)
+        self.contains_event = contains_event
+        self.positive_ratio = positive_ratio
+        super().__init__(weights.tolist(), num_samples if num_samples is not None else len(contains_event),
+                         replacement=replacement, generator=generator)
+
+    @classmethod
+    def from_dataset(cls, dataset, **kwargs) -> 'EventWeightedSampler':
+        """
+        Build the sampler from a dataset with a `contains_event_array()` or a `contains_event(idx)` method
+        (`RawOscarDataset`, `WindowedOscarDataset`), which uses an event index instead of loading the elements.
+
+        Args:
+            dataset: the dataset to sample
+            **kwargs: other arguments of `EventWeightedSampler`
+
+        Returns:
+            The sampler of the dataset
+        """
+        if hasattr(dataset, 'contains_event_array'):
+            return cls(dataset.contains_event_array(), **kwargs)
+        return cls([dataset.contains_event(idx) for idx in range(len(dataset))], **kwargs)
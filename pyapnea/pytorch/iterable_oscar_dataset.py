@@ -0,0 +1,180 @@
+import random
+from typing import List, Optional, Union, Iterator
+
+import numpy as np
+import pandas as pd
+import torch.distributed as dist
+from torch.utils.data import IterableDataset, get_worker_info
+
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_events import APNEA_EVENTS, EventIntervals
+from pyapnea.oscar.oscar_loader import load_session, load_session_metadata, list_session_files
+
+
+class IterableOscarDataset(IterableDataset):
+
+    def __init__(self,
+                 data_path: str,
+                 window_length: int,
+                 stride: Optional[int] = None,
+                 limits: slice = None,
+                 channel_id: int = ChannelID.CPAP_FlowRate.value,
+                 output_events_merged: Optional[List[Union[ChannelID, int]]] = None,
+                 length_event: Optional[str] = '10s',
+                 shuffle: bool = False,
+                 shuffle_buffer_size: int = 1024,
+                 seed: int = 0,
+                 rank: Optional[int] = None,
+                 world_size: Optional[int] = None):
+        """
+        Iterable torch dataset streaming fixed-length windows of one channel of raw OSCAR data, with the same windows
+        and annotations as `WindowedOscarDataset`.
+        Session files are memory-mapped and windows are produced while iterating, so the memory of a worker does not
+        depend on the length or the number of sessions. Windows are sharded across ranks (distributed training) and
+        DataLoader workers: the windows of all files (counted once from the metadata) are split in contiguous
+        ranges, so a worker reads whole files except at the bounds of its range. All ranks get the same number of
+        windows, as required by collective operations: when the number of windows is not a multiple of
+        `world_size`, the first windows are repeated at the end (as `DistributedSampler`). This works with any
+        number of files, even fewer files than ranks and workers.
+
+        Args:
+            data_path: the data path of the OSCAR data. The path must contain the directory of all CPAP machine.
+            window_length: number of samples of a window
+            stride: number of samples between the beginning of two consecutive windows. None means `window_length`
+                (no overlap).
+            limits: slice to filter the session files. None means no limit.
+            channel_id: channel id (.value, see channelID in oscar_constants.py) of the channel to get
+            output_events_merged: List of apnea events (ChannelID) to merge into the annotation, None means all apnea
+                event types are merged
+            length_event: length of the events to complete annotations. format in Offset aliases. None for
+                annotating the end of the events only.
+            shuffle: if True, the order of the files is shuffled at each epoch (see `set_epoch`) and windows go
+                through a shuffle buffer
+            shuffle_buffer_size: number of windows of the shuffle buffer of each worker
+            seed: seed of the shuffling, the same on all ranks and workers
+            rank: rank of the process. None means the rank of the default process group if torch.distributed is
+                initialized, else 0.
+            world_size: number of processes. None means the size of the default process group if torch.distributed
+                is initialized, else 1.
+        """
+        self.window_length = window_length
+        self.stride = stride if stride is not None else window_length
+        self.channel_id = channel_id
+        self.list_files = list_session_files(data_path)
+        if limits is not None:
+            self.list_files = self.list_files[limits]
+
+        apnea_events = output_events_merged if output_events_merged else APNEA_EVENTS
+        self.apnea_event_ids = [c.value if isinstance(c, ChannelID) else c for c in apnea_events]
+        self.length_ms = int(pd.to_timedelta(length_event).total_seconds() * 1000) if length_event is not None else 0
+        # number of windows of each file, from the metadata
+        self.nb_windows = [self._count_windows(filename) for filename in self.list_files]
+
+        self.shuffle = shuffle
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.epoch = 0
+        is_distributed = dist.is_available() and dist.is_initialized()
+        self.rank = rank if rank is not None else (dist.get_rank() if is_distributed else 0)
+        self.world_size = world_size if world_size is not None else (dist.get_world_size() if is_distributed else 1)
+
+    def _count_windows(self, filename: str) -> int:
+        """ Count the windows of one session file from its metadata (see `_iter_file`)."""
+        oscar_session_data = load_session_metadata(filename)
+        channel = next((c for c in oscar_session_data.data.channels if c.code == self.channel_id), None)
+        return sum((evt.evcount - self.window_length) // self.stride + 1
+                   for evt in (channel.events if channel is not None else [])
+                   if evt.t8 == 0 and evt.evcount >= self.window_length)
+
+    def __len__(self):
+        """ Number of windows of the current rank, for all its workers."""
+        return -(-sum(self.nb_windows) // self.world_size)
+
+    def set_epoch(self, epoch: int):
+        """ Set the epoch, used to shuffle the files and the windows differently at each epoch."""
+        self.epoch = epoch
+
+    def _get_shard(self) -> tuple[int, int]:
+        """ Get the shard of the current worker of the current rank and the number of shards."""
+        worker_info = get_worker_info()
+        worker_id, num_workers = (worker_info.id, worker_info.num_workers) if worker_info is not None else (0, 1)
+        return self.rank * num_workers + worker_id, self.world_size * num_workers
+
+    def get_windows(self) -> List[tuple[str, int, int]]:
+        """
+        Get the windows read by the current worker of the current rank.
+
+        Returns:
+            List of ranges of windows (full path of the session file, first window, end window) of the shard, the
+            windows of a file are numbered in the order of `_iter_file`
+        """
+        order = list(range(len(self.list_files)))
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(order)
+        worker_info = get_worker_info()
+        worker_id, num_workers = (worker_info.id, worker_info.num_workers) if worker_info is not None else (0, 1)
+        # range of the rank (the same length for all ranks, windows after the end are the first windows again),
+        # then range of the worker in the range of the rank
+        total = sum(self.nb_windows)
+        rank_length = len(self)
+        begin = self.rank * rank_length + worker_id * rank_length // num_workers
+        end = self.rank * rank_length + (worker_id + 1) * rank_length // num_workers
+        windows = []
+        while begin < end and total > 0:
+            file_begin = begin // total * total
+            for file_num in order:
+                file_end = file_begin + self.nb_windows[file_num]
+                if begin < file_end and file_begin < end:
+                    windows.append((self.list_files[file_num], max(begin, file_begin) - file_begin,
+                                    min(end, file_end) - file_begin))
+                file_begin = file_end
+            begin = file_begin
+        return windows
+
+    def _iter_file(self, filename: str, first: int = 0,
+                   end: Optional[int] = None) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """ Produce the windows `first` to `end` (excluded) of one session file."""
+        oscar_session_data = load_session(filename, use_mmap=True, channels=[self.channel_id] + self.apnea_event_ids)
+        intervals = EventIntervals.from_session(oscar_session_data, self.apnea_event_ids)
+        channel = next((c for c in oscar_session_data.data.channels if c.code == self.channel_id), None)
+        window_num = 0
+        for evt in channel.events if channel is not None else []:
+            if evt.t8 != 0 or evt.evcount < self.window_length:
+                continue
+            gain = np.float32(evt.gain)
+            for start in range(0, evt.evcount - self.window_length + 1, self.stride):
+                window_num += 1
+                if window_num <= first:
+                    continue
+                if end is not None and window_num > end:
+                    return
+                samples = evt.data[start:start + self.window_length] * gain
+                times = evt.ts1 + (start + np.arange(self.window_length, dtype=np.int64)) * int(evt.rate)
+                labels = intervals.labels(times, self.length_ms).astype(np.float32)
+                yield samples.reshape(-1, 1), labels.reshape(-1, 1)
+
+    def __iter__(self):
+        """
+        Iterate over the windows of the session files of the current worker.
+
+        Returns:
+            An iterator of tuples (samples with gain applied, annotations), both float32 arrays of shape
+            (window_length, 1)
+        """
+        windows = (window for filename, first, end in self.get_windows()
+                   for window in self._iter_file(filename, first, end))
+        if not self.shuffle or self.shuffle_buffer_size <= 1:
+            yield from windows
+            return
+        shard, _ = self._get_shard()
+        rng = random.Random(f'{self.seed}-{self.epoch}-{shard}')
+        buffer = []
+        for window in windows:
+            if len(buffer) < self.shuffle_buffer_size:
+                buffer.append(window)
+                continue
+            position = rng.randrange(len(buffer))
+            yield buffer[position]
+            buffer[position] = window
+        rng.shuffle(buffer)
+        yield from buffer
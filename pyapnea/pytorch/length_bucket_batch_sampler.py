@@ -0,0 +1,100 @@
+from typing import Sequence, Iterator, List
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+class LengthBucketBatchSampler(Sampler[List[int]]):
+
+    def __init__(self,
+                 lengths: Sequence[int],
+                 batch_size: int,
+                 shuffle: bool = True,
+                 bucket_size_multiplier: int = 100,
+                 drop_last: bool = False,
+                 seed: int = 0):
+        """
+        Batch sampler grouping elements of similar length, so that padding a batch to its longest element wastes
+        little memory and computation. Elements are drawn in buckets of `batch_size * bucket_size_multiplier`
+        elements, each bucket is sorted by length and cut into batches, then the batches are shuffled.
+
+        Args:
+            lengths: length of each element of the dataset (see `RawOscarDataset.item_lengths`)
+            batch_size: number of elements of a batch
+            shuffle: if True, elements and batches are shuffled at each epoch (see `set_epoch`). Otherwise all
+                elements are in one bucket sorted by length.
+            bucket_size_multiplier: number of batches of a bucket
+            drop_last: if True, the last incomplete batch of each bucket is dropped
+            seed: seed of the shuffling
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_size_multiplier if shuffle else max(len(self.lengths), 1)
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    @classmethod
+    def from_dataset(cls, dataset, batch_size: int, **kwargs) -> 'LengthBucketBatchSampler':
+        """
+        Build the sampler from a dataset with an `item_lengths()` method (`RawOscarDataset`), which reads the
+        lengths from the metadata of the session files instead of loading the elements.
+
+        Args:
+            dataset: the dataset to sample
+            batch_size: number of elements of a batch
+            **kwargs: other arguments of `LengthBucketBatchSampler`
+
+        Returns:
+            The batch sampler of the dataset
+        """
+        return cls(dataset.item_lengths(), batch_size, **kwargs)
+
+    def set_epoch(self, epoch: int):
+        """ Set the epoch, used to shuffle the batches differently at each epoch."""
+        self.epoch = epoch
+
+    def _get_batches(self) -> List[np.ndarray]:
+        rng = np.random.default_rng((self.seed, self.epoch))
+        indexes = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for bucket_start in range(0, len(indexes), self.bucket_size):
+            bucket = indexes[bucket_start:bucket_start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            for batch_start in range(0, len(bucket), self.batch_size):
+                batch = bucket[batch_start:batch_start + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        for batch in self._get_batches():
+            yield batch.tolist()
+
+    def __len__(self):
+        return len(self._get_batches())
+
+
+def pad_collate(batch: Sequence[tuple], padding_value: float = 0.0) -> tuple[torch.Tensor, ...]:
+    """
+    Collate elements of different lengths (x, y) by padding them to the length of the longest element of the batch.
+
+    Args:
+        batch: list of tuples (x, y) of arrays or tensors of shape (length, ...) (`RawOscarDataset` elements)
+        padding_value: value of the padded samples
+
+    Returns:
+        A tuple (x, y, lengths, mask): x and y padded to shape (batch size, max length, ...), the length of each
+        element and a boolean mask of shape (batch size, max length), True for the samples that are not padding
+    """
+    lengths = torch.tensor([len(x) for x, _ in batch], dtype=torch.int64)
+    xs = torch.nn.utils.rnn.pad_sequence([torch.as_tensor(x) for x, _ in batch], batch_first=True,
+                                         padding_value=padding_value)
+    ys = torch.nn.utils.rnn.pad_sequence([torch.as_tensor(y) for _, y in batch], batch_first=True,
+                                         padding_value=padding_value)
+    mask = torch.arange(xs.shape[1])[None, :] < lengths[:, None]
+    return xs, ys, lengths, mask
@@ -1,14 +1,34 @@
 import os.path
-from typing import List, Optional
+from typing import List, Optional, Dict
 from os import listdir
 from os.path import isfile, join, isdir
 
+import numpy as np
+import pandas as pd
+import torch
+
 from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_events import EventIndex, EventIntervals, _get_codes
 from pyapnea.oscar.oscar_getter import event_data_to_dataframe
-from pyapnea.oscar.oscar_loader import load_session
+from pyapnea.oscar.oscar_loader import load_session, load_session_metadata
+from pyapnea.profiling import profile_stage
 from torch.utils.data import Dataset
 
 from pyapnea.utils.annotations import generate_annotations
+from pyapnea.utils.cache import DiskCache, LRUCache
+
+
+def _dataframe_to_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """ Convert an annotated dataframe (indexed by 'time_utc') to arrays for the disk cache."""
+    arrays = {'time_utc': df.index.asi8}
+    arrays.update({column: df[column].to_numpy() for column in df.columns})
+    return arrays
+
+
+def _arrays_to_dataframe(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """ Convert arrays from the disk cache to an annotated dataframe (indexed by 'time_utc')."""
+    index = pd.DatetimeIndex(pd.to_datetime(arrays.pop('time_utc'), unit='ns', utc=True), name='time_utc')
+    return pd.DataFrame(arrays, index=index)
 
 
 class RawOscarDataset(Dataset):
@@ -18,17 +38,30 @@ class RawOscarDataset(Dataset):
                  getitem_type: str = 'numpy',
                  limits: slice = None,
                  output_events_merged: Optional[List[ChannelID]] = None,
-                 channel_ids: Optional[List[ChannelID]] = None):
+                 channel_ids: Optional[List[ChannelID]] = None,
+                 length_event: Optional[str] = '10S',
+                 cache_dir: Optional[str] = None,
+                 memory_cache_bytes: int = 0):
         """
         Torch dataset for handling raw OSCAR data.
-        This class generates annotations within 10s before the end of the apnea event.
+        This class generates annotations within `length_event` (10s by default) before the end of the apnea event.
 
         Args:
             data_path: the data path of the OSCAR data. The path must contain the directory of all CPAP machine.
-            getitem_type: The type of one element obtained by the [] operator. Can be 'numpy' or 'dataframe'.
+            getitem_type: The type of one element obtained by the [] operator. Can be 'numpy', 'torch' or 'dataframe'.
+                'numpy' (float64 arrays) and 'torch' (float32 tensors) give a tuple (FlowRate, ApneaEvent) of shape
+                (length, 1). With the default `channel_ids`, they are computed from the decoded samples without
+                building a dataframe.
             limits: slice to filter the dataset. None means no limit.
-            output_events_merged: List of apnea events (ChannelID) to merge into the 'ApneaEvent' column, None means all apnea event types are merged
+            output_events_merged: List of apnea events (ChannelID or .value of ChannelID) to merge into the 'ApneaEvent' column, None means all apnea event types are merged
             channel_ids: List of channel to get. If None, only CPAP_FlowRate is get.
+            length_event: length of the events to complete annotations (see `generate_annotations`).
+            cache_dir: directory of an on-disk cache of the annotated data of each session file. None means no cache.
+                The cache is keyed by the session file (path, size and modification time) and by `channel_ids`,
+                `output_events_merged` and `length_event`, so entries are invalidated when any of them changes.
+            memory_cache_bytes: maximum number of bytes of the in-memory cache of elements. The least recently used
+                elements are evicted first. 0 means no in-memory cache. With a DataLoader, each worker has its own
+                cache. Cached elements are returned as-is, they must not be modified.
         """
         self.getitem_type = getitem_type
         list_machines = [d for d in listdir(data_path) if isdir(os.path.join(data_path, d))]
@@ -56,29 +89,175 @@ class RawOscarDataset(Dataset):
             self.channel_ids = [ChannelID.CPAP_FlowRate.value]
 
         self.output_events_merged = output_events_merged
+        self.length_event = length_event
+
+        self.disk_cache = None
+        if cache_dir is not None:
+            # 'numpy' and 'torch' elements only store the FlowRate and ApneaEvent columns
+            self.disk_cache = DiskCache(cache_dir, {'channel_ids': self.channel_ids,
+                                                    'output_events_merged': self.output_events_merged,
+                                                    'length_event': self.length_event,
+                                                    'arrays': self.getitem_type != 'dataframe'})
+
+        self.memory_cache = None
+        if memory_cache_bytes > 0:
+            self.memory_cache = LRUCache(memory_cache_bytes)
+
+        self._event_index = None
+        self._item_lengths = None
 
     def __len__(self):
         return len(self.list_files)
 
-    def __getitem__(self, idx):
-        result = None
-        oscar_session_data = load_session(self.list_files[idx]['fullpath'])
+    def _get_channels_to_get(self) -> List[int]:
         channel_to_get = [ChannelID.CPAP_Obstructive.value,  # Apnée obstructive
                           ChannelID.CPAP_ClearAirway.value,  # Apnée centrale
                           ChannelID.CPAP_Hypopnea.value,  # Hypopnée
                           ChannelID.CPAP_Apnea.value,  # Non déterminé
                           ]
         channel_to_get.extend(self.channel_ids)
+        return channel_to_get
+
+    def _get_output_event_codes(self) -> set:
+        """
+        Channel ids of the events merged into 'ApneaEvent' and loaded with an element, ChannelID or channel ids are
+        accepted as in `generate_annotations`.
+        """
+        return _get_codes(self.output_events_merged) & set(self._get_channels_to_get())
+
+    def event_index(self) -> EventIndex:
+        """
+        Get the index of the apnea events of the elements, built on first call from the flag channels only (the
+        elements are not loaded). An element contains an event in the index if and only if its 'ApneaEvent'
+        column contains a 1.
+
+        Returns:
+            The event index, one item per element
+        """
+        if self._event_index is None:
+            # only the events merged into 'ApneaEvent' and loaded in the dataframe of an element
+            codes = self._get_output_event_codes()
+            # rows without FlowRate are removed from the dataframe of an element
+            reference_channel_id = ChannelID.CPAP_FlowRate.value \
+                if ChannelID.CPAP_FlowRate.value in self.channel_ids else None
+            self._event_index = EventIndex([f['fullpath'] for f in self.list_files], codes, reference_channel_id)
+        return self._event_index
+
+    def contains_event(self, idx) -> bool:
+        """
+        Check whether an element contains at least one apnea event, without loading the element (see `event_index`).
+        """
+        return bool(self.contains_event_array()[idx])
+
+    def contains_event_array(self) -> np.ndarray:
+        """
+        Check which elements contain at least one apnea event, without loading the elements (see `event_index`).
+
+        Returns:
+            True for each element containing an event (read-only array computed on first call)
+        """
+        return self.event_index().contains_event()
+
+    def item_lengths(self) -> np.ndarray:
+        """
+        Get the length of each element (number of FlowRate samples) from the metadata of the session files, without
+        loading the elements. Computed on first call.
+
+        Returns:
+            The length of each element
+        """
+        if self._item_lengths is None:
+            lengths = []
+            for f in self.list_files:
+                oscar_session_data = load_session_metadata(f['fullpath'])
+                lengths.append(sum(evt.evcount for channel in oscar_session_data.data.channels
+                                   if channel.code == ChannelID.CPAP_FlowRate.value for evt in channel.events))
+            self._item_lengths = np.array(lengths, dtype=np.int64)
+        return self._item_lengths
+
+    def _get_dataframe(self, idx) -> pd.DataFrame:
+        """ Load and annotate the session file at `idx`."""
+        channel_to_get = self._get_channels_to_get()
+        oscar_session_data = load_session(self.list_files[idx]['fullpath'], use_mmap=True, channels=channel_to_get)
         df = event_data_to_dataframe(oscar_session_data,
                                      channel_ids=channel_to_get,
                                      mis_value_strategy={ChannelID.CPAP_FlowRate.value: 'ignore'})
 
         df.set_index('time_utc', inplace=True)
         df.sort_index(inplace=True)
-        df = generate_annotations(df, length_event='10S', output_events_merge=self.output_events_merged)
+        df = generate_annotations(df, length_event=self.length_event, output_events_merge=self.output_events_merged)
+        return df
+
+    def _get_arrays(self, idx) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Compute the 'time_utc' (ns), 'FlowRate' and 'ApneaEvent' columns of the dataframe of the session file at `idx`
+        directly from the decoded samples. Returns None when the dataframe is needed to get the same rows: other
+        channels than FlowRate, or channels with duplicated times (duplicated rows in the outer join).
+        """
+        channel_ids = [c.value if isinstance(c, ChannelID) else c for c in self.channel_ids]
+        if channel_ids != [ChannelID.CPAP_FlowRate.value]:
+            return None
+        channel_to_get = self._get_channels_to_get()
+        oscar_session_data = load_session(self.list_files[idx]['fullpath'], use_mmap=True, channels=channel_to_get)
+        flowrate = None
+        for channel in oscar_session_data.data.channels:
+            times = np.concatenate([evt.get_time() + evt.ts1 for evt in channel.events] + [np.empty(0, np.int64)])
+            order = np.argsort(times, kind='stable')
+            if np.any(np.diff(times[order]) == 0):
+                return None
+            if channel.code == ChannelID.CPAP_FlowRate.value and len(times) > 0:
+                flowrate = times[order], np.concatenate([evt.data * evt.gain for evt in channel.events])[order]
+        if flowrate is None:
+            return None
+        times, values = flowrate
+
+        codes = self._get_output_event_codes()
+        intervals = EventIntervals.from_session(oscar_session_data, codes)
+        # events are rows of the dataframe only at the time of a FlowRate sample
+        positions = np.minimum(np.searchsorted(times, intervals.end), len(times) - 1)
+        intervals = intervals.subset(times[positions] == intervals.end)
+        length_ms = int(pd.to_timedelta(self.length_event).total_seconds() * 1000) \
+            if self.length_event is not None else 0
+        labels = intervals.labels(times, length_ms).astype(np.float64)
+        return {'time_utc': times * 1000000, 'FlowRate': values, 'ApneaEvent': labels}
+
+    def __getitem__(self, idx):
+        with profile_stage('RawOscarDataset.__getitem__') as stage:
+            result = self._get_item(idx)
+            if stage.enabled:
+                stage.nbytes = os.path.getsize(self.list_files[idx]['fullpath'])
+        return result
+
+    def _get_item(self, idx):
+        if self.memory_cache is not None:
+            result = self.memory_cache.get(idx)
+            if result is not None:
+                return result
 
-        if self.getitem_type == 'numpy':
-            result = df[['FlowRate']].to_numpy(), df[['ApneaEvent']].to_numpy()
+        result = None
+        fullpath = self.list_files[idx]['fullpath']
+        arrays = self.disk_cache.get(fullpath) if self.disk_cache is not None else None
         if self.getitem_type == 'dataframe':
+            if arrays is not None:
+                df = _arrays_to_dataframe(arrays)
+            else:
+                df = self._get_dataframe(idx)
+                if self.disk_cache is not None:
+                    self.disk_cache.put(fullpath, _dataframe_to_arrays(df))
             result = df
+        else:
+            if arrays is None:
+                arrays = self._get_arrays(idx)
+                if arrays is None:
+                    arrays = _dataframe_to_arrays(self._get_dataframe(idx)[['FlowRate', 'ApneaEvent']])
+                if self.disk_cache is not None:
+                    self.disk_cache.put(fullpath, arrays)
+            x, y = arrays['FlowRate'].reshape(-1, 1), arrays['ApneaEvent'].reshape(-1, 1)
+            if self.getitem_type == 'numpy':
+                result = x, y
+            if self.getitem_type == 'torch':
+                result = torch.from_numpy(x.astype(np.float32)), torch.from_numpy(y.astype(np.float32))
+
+        if self.memory_cache is not None:
+            self.memory_cache.put(idx, result)
         return result
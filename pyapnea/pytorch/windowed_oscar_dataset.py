@@ -0,0 +1,162 @@
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from torch.utils.data import Dataset
+
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_events import APNEA_EVENTS, load_event_intervals
+from pyapnea.oscar.oscar_loader import load_session, load_session_layout, list_session_files
+from pyapnea.utils.cache import LRUCache
+
+
+class WindowedOscarDataset(Dataset):
+
+    def __init__(self,
+                 data_path: str,
+                 window_length: int,
+                 stride: Optional[int] = None,
+                 limits: slice = None,
+                 channel_id: int = ChannelID.CPAP_FlowRate.value,
+                 output_events_merged: Optional[List[Union[ChannelID, int]]] = None,
+                 length_event: Optional[str] = '10s',
+                 compressed_cache_bytes: int = 256 * 1024 * 1024):
+        """
+        Torch dataset of fixed-length windows of one channel of raw OSCAR data.
+        The windows are indexed once from the metadata of the session files, then each element reads only the bytes
+        of its window in the session file, so the cost of an element does not depend on the length of the session.
+        Compressed session files can not be read partially: the channel is decompressed once per file and kept in
+        an in-memory cache (`compressed_cache_bytes`).
+        Windows do not overlap two events of the channel (i.e. gaps in the recording). Only events with a regular sampling (`t8 == 0`) are used.
+        A sample is annotated when it is within `length_event` before the end of an apnea event.
+
+        Args:
+            data_path: the data path of the OSCAR data. The path must contain the directory of all CPAP machine.
+            window_length: number of samples of a window
+            stride: number of samples between the beginning of two consecutive windows. None means `window_length`
+                (no overlap).
+            limits: slice to filter the session files. None means no limit.
+            channel_id: channel id (.value, see channelID in oscar_constants.py) of the channel to get
+            output_events_merged: List of apnea events (ChannelID) to merge into the annotation, None means all apnea
+                event types are merged
+            length_event: length of the events to complete annotations. format in Offset aliases. None for
+                annotating the end of the events only.
+            compressed_cache_bytes: maximum number of bytes of the in-memory cache of the channel samples of
+                compressed session files. The least recently used files are evicted first. With a DataLoader, each
+                worker has its own cache.
+        """
+        self.window_length = window_length
+        self.stride = stride if stride is not None else window_length
+        self.channel_id = channel_id
+        self.list_files = list_session_files(data_path)
+        if limits is not None:
+            self.list_files = self.list_files[limits]
+
+        apnea_events = output_events_merged if output_events_merged else APNEA_EVENTS
+        self.apnea_event_ids = [c.value if isinstance(c, ChannelID) else c for c in apnea_events]
+        self.length_ms = int(pd.to_timedelta(length_event).total_seconds() * 1000) if length_event is not None else 0
+
+        # for each file: list of (position of data in file or None if compressed, gain, ts1, rate) of each event
+        self.events = []
+        # for each file: apnea events (EventIntervals)
+        self.event_intervals = []
+        file_nums, event_nums, starts = [], [], []
+        for file_num, filename in enumerate(self.list_files):
+            oscar_session_data, data_positions = load_session_layout(filename)
+            self.events.append([])
+            channel = next((c for c in oscar_session_data.data.channels if c.code == channel_id), None)
+            for event_num, evt in enumerate(channel.events if channel is not None else []):
+                position = data_positions[channel_id][event_num] if data_positions is not None else None
+                self.events[file_num].append((position, evt.gain, evt.ts1, evt.rate))
+                if evt.t8 != 0 or evt.evcount < window_length:
+                    continue
+                event_starts = np.arange(0, evt.evcount - window_length + 1, self.stride)
+                file_nums.append(np.full(len(event_starts), file_num))
+                event_nums.append(np.full(len(event_starts), event_num))
+                starts.append(event_starts)
+            self.event_intervals.append(load_event_intervals(filename, self.apnea_event_ids))
+
+        self.window_file = np.concatenate(file_nums) if file_nums else np.empty(0, dtype=np.int64)
+        self.window_event = np.concatenate(event_nums) if event_nums else np.empty(0, dtype=np.int64)
+        self.window_start = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+        self._window_event_counts = None
+        self.compressed_cache = LRUCache(compressed_cache_bytes)
+
+    def __len__(self):
+        return len(self.window_start)
+
+    def window_event_counts(self) -> np.ndarray:
+        """
+        Count the apnea events (extended by `length_event`) overlapping the time range of each window, from the
+        event intervals only (windows are not read). Computed on first call.
+
+        Returns:
+            Number of events of each window
+        """
+        if self._window_event_counts is None:
+            counts = np.zeros(len(self), dtype=np.int64)
+            # windows are built in file order: the windows of each file are a range of `window_file`
+            bounds = np.searchsorted(self.window_file, np.arange(len(self.event_intervals) + 1))
+            for file_num, intervals in enumerate(self.event_intervals):
+                windows = slice(bounds[file_num], bounds[file_num + 1])
+                if bounds[file_num] == bounds[file_num + 1]:
+                    continue
+                ts1 = np.array([evt[2] for evt in self.events[file_num]], dtype=np.int64)
+                rate = np.array([int(evt[3]) for evt in self.events[file_num]], dtype=np.int64)
+                event_nums = self.window_event[windows]
+                starts = ts1[event_nums] + self.window_start[windows] * rate[event_nums]
+                ends = starts + (self.window_length - 1) * rate[event_nums]
+                counts[windows] = intervals.count_overlapping(starts, ends, self.length_ms)
+            self._window_event_counts = counts
+        return self._window_event_counts
+
+    def contains_event(self, idx) -> bool:
+        """
+        Check whether a window contains at least one apnea event, without reading the window (see
+        `window_event_counts`).
+        """
+        return bool(self.window_event_counts()[idx] > 0)
+
+    def contains_event_array(self) -> np.ndarray:
+        """
+        Check which windows contain at least one apnea event, without reading the windows (see
+        `window_event_counts`).
+
+        Returns:
+            True for each window containing an event
+        """
+        return self.window_event_counts() > 0
+
+    def _read_samples(self, file_num: int, event_num: int, start: int) -> np.ndarray:
+        """
+        Read the samples of one window. Only the bytes of the window are read for uncompressed files, the channel of
+        compressed files is decompressed on first use and cached.
+        """
+        position = self.events[file_num][event_num][0]
+        if position is None:
+            samples = self.compressed_cache.get(file_num)
+            if samples is None:
+                oscar_session_data = load_session(self.list_files[file_num], channels=[self.channel_id])
+                # copies, so the cache does not keep the whole decompressed session data
+                samples = [np.array(evt.data) for evt in oscar_session_data.data.channels[0].events]
+                self.compressed_cache.put(file_num, samples)
+            return samples[event_num][start:start + self.window_length]
+        itemsize = np.dtype(np.int16).itemsize
+        with open(self.list_files[file_num], mode='rb') as file:
+            file.seek(position + start * itemsize)
+            buffer = file.read(self.window_length * itemsize)
+        return np.frombuffer(buffer, dtype=np.int16)
+
+    def __getitem__(self, idx):
+        """
+        Get one window.
+
+        Returns:
+            A tuple (samples with gain applied, annotations), both float32 arrays of shape (window_length, 1)
+        """
+        file_num, event_num, start = self.window_file[idx], self.window_event[idx], int(self.window_start[idx])
+        _, gain, ts1, rate = self.events[file_num][event_num]
+        samples = self._read_samples(file_num, event_num, start)
+        times = ts1 + (start + np.arange(self.window_length, dtype=np.int64)) * int(rate)
+        labels = self.event_intervals[file_num].labels(times, self.length_ms).astype(np.float32)
+        return (samples * np.float32(gain)).reshape(-1, 1), labels.reshape(-1, 1)
@@ -1 +1,15 @@
-from .annotations import *
\ No newline at end of file
+from ..base_functions import get_lazy_attribute
+
+# modules using pandas are imported on first use of one of their names
+LAZY_NAMES = {name: '.annotations' for name in ['generate_annotations', 'is_contain_event', 'get_nb_events']}
+LAZY_NAMES.update({name: '.cache' for name in ['CACHE_FORMAT_VERSION', 'DiskCache', 'get_nbytes', 'LRUCache']})
+
+__all__ = list(LAZY_NAMES)
+
+
+def __getattr__(name):
+    return get_lazy_attribute(__name__, LAZY_NAMES, name)
+
+
+def __dir__():
+    return __all__
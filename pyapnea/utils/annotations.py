@@ -1,7 +1,9 @@
 import numpy as np
 import pandas as pd
 
-from pyapnea.oscar.oscar_constants import CHANNELS, ChannelID
+from pyapnea.oscar.oscar_constants import CHANNEL_NAMES
+from pyapnea.oscar.oscar_events import _get_codes
+from pyapnea.profiling import profile_stage
 
 
 def generate_annotations(df: pd.DataFrame, length_event=None, output_events_merge=None):
@@ -12,31 +14,32 @@ def generate_annotations(df: pd.DataFrame, length_event=None, output_events_merg
         df: source dataframe used to generate annotation.
         length_event: length of the events to complete annotations. format in Offset aliases. \
                         None for keeping annotation as-is (default).
-        output_events_merge: list of ChannelID (not value of ChannelID) to merge to become the ApneaEvent. None for all apnea events
+        output_events_merge: list of ChannelID (or value of ChannelID) to merge to become the ApneaEvent. None for all apnea events
 
     Returns:
         A copy of the dataframe with annotations added inside a 'ApneaEvent' column.
     """
-    result = df.copy()
-    if output_events_merge:
-        possible_apnea_events = output_events_merge
-    else:
-        possible_apnea_events = [ChannelID.CPAP_ClearAirway, ChannelID.CPAP_Obstructive, ChannelID.CPAP_Hypopnea,
-                                 ChannelID.CPAP_Apnea]
-    possible_apnea_events_str = [c[5] for c in CHANNELS if c[1] in possible_apnea_events]
-    events_in_origin = [i for i in result.columns if i in possible_apnea_events_str]
-    if len(events_in_origin) == 0:
-        result['ApneaEvent'] = 0.0
-    else:
-        result['ApneaEvent'] = result[events_in_origin].sum(axis=1)
-        result['ApneaEvent'] = result['ApneaEvent'].apply(lambda x: 1 if (not pd.isnull(x)) and (x != 0) else np.nan)
-        result.fillna({'ApneaEvent': 0}, inplace=True)
-        if length_event is not None:
-            list_index_annot = result.index[result['ApneaEvent'] == 1].tolist()
-            for annot_index in list_index_annot:
-                indexes = result.index[((result.index <= annot_index) &
-                                        (result.index >= (annot_index - pd.to_timedelta(length_event))))]
-                result.loc[indexes, 'ApneaEvent'] = 1
+    with profile_stage('annotations.generate_annotations') as stage:
+        result = df.copy()
+        # ChannelID or channel ids, all apnea events if None
+        possible_apnea_events_str = [CHANNEL_NAMES[code] for code in _get_codes(output_events_merge)
+                                     if code in CHANNEL_NAMES]
+        events_in_origin = [i for i in result.columns if i in possible_apnea_events_str]
+        if len(events_in_origin) == 0:
+            result['ApneaEvent'] = 0.0
+        else:
+            events = result[events_in_origin].sum(axis=1).to_numpy()
+            is_event = (events != 0) & ~np.isnan(events)
+            if length_event is not None and is_event.any():
+                # a row is annotated if an event ends within `length_event` after it: the events in
+                # [time, time + length_event] are counted with a binary search on the sorted event times
+                event_times = result.index[is_event].sort_values()
+                nb_events = (event_times.searchsorted(result.index + pd.to_timedelta(length_event), side='right') -
+                             event_times.searchsorted(result.index, side='left'))
+                is_event = nb_events > 0
+            result['ApneaEvent'] = is_event.astype(np.float64)
+        if stage.enabled:
+            stage.nbytes = int(df.memory_usage().sum())
 
     return result
 
@@ -61,12 +64,15 @@ def is_contain_event(element, output_type='dataframe'):
 
 def get_nb_events(dataset):
     """
-    Get the number of element of a dataset that contain at least one apnea event
+    Get the number of element of a dataset that contain at least one apnea event. If the dataset has an event index
+    (`event_index()`, see `EventIndex`), the elements are not loaded.
 
     Returns:
         A tuple containing (number of events, list of all events)
     """
-
-    events = [is_contain_event(element, dataset.getitem_type) for element in dataset]
+    if hasattr(dataset, 'event_index'):
+        events = dataset.event_index().contains_event().tolist()
+    else:
+        events = [is_contain_event(element, dataset.getitem_type) for element in dataset]
     nb_contain_event = events.count(True)
     return nb_contain_event, events
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Hashable
+
+import numpy as np
+import pandas as pd
+
+# to be increased when the format of the cache entries changes
+CACHE_FORMAT_VERSION = 2
+
+
+class DiskCache:
+
+    def __init__(self, cache_dir: str, parameters: Optional[Dict[str, Any]] = None):
+        """
+        On-disk cache of arrays computed from a session file.
+        An entry is identified by the path, the size and the modification time of the session file and by
+        `parameters`, in nested directories `<path>/<size and modification time>/<parameters>`. Each entry is stored
+        as one .npy file per column. Entries become stale as soon as the session file changes and the stale entries
+        of a file are removed when a new entry is stored. Entries of other parameters of the same file stay valid,
+        so datasets with different parameters can share a cache directory.
+
+        Args:
+            cache_dir: directory of the cache. It is created if it does not exist.
+            parameters: parameters used to compute the arrays. Their `repr` is part of the key of the entries.
+        """
+        self.cache_dir = cache_dir
+        self.parameters = repr(sorted((parameters or {}).items()))
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_entry_path(self, filename: str) -> tuple[str, str, str]:
+        """
+        Get the directory of all entries of a session file, the directory of the entries of the current version of
+        the file and the directory of the current entry.
+        """
+        stat = os.stat(filename)
+        path_key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+        identity_key = hashlib.sha1(repr((CACHE_FORMAT_VERSION, stat.st_size,
+                                          stat.st_mtime_ns)).encode()).hexdigest()
+        entry_key = hashlib.sha1(self.parameters.encode()).hexdigest()
+        file_dir = os.path.join(self.cache_dir, path_key)
+        identity_dir = os.path.join(file_dir, identity_key)
+        return file_dir, identity_dir, os.path.join(identity_dir, entry_key)
+
+    def get(self, filename: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Get the arrays of a session file from the cache.
+
+        Args:
+            filename: full path of the session file
+
+        Returns:
+            A dictionary of arrays (column name -> array) or None if there is no valid entry for the file
+        """
+        _, _, entry_dir = self._get_entry_path(filename)
+        try:
+            with open(os.path.join(entry_dir, 'columns.json')) as file:
+                columns = json.load(file)
+            return {column: np.load(os.path.join(entry_dir, f'{i}.npy'), allow_pickle=False)
+                    for i, column in enumerate(columns)}
+        except OSError:
+            # no entry, or entry removed by another process while it is read
+            return None
+
+    def put(self, filename: str, arrays: Dict[str, np.ndarray]):
+        """
+        Store the arrays of a session file in the cache. Entries of previous versions of the file are removed.
+
+        Args:
+            filename: full path of the session file
+            arrays: dictionary of arrays (column name -> array)
+        """
+        file_dir, identity_dir, entry_dir = self._get_entry_path(filename)
+        os.makedirs(identity_dir, exist_ok=True)
+        # the entry is written in a temporary directory and renamed, so a partial entry is never read
+        temp_dir = tempfile.mkdtemp(prefix='tmp', dir=identity_dir)
+        for i, array in enumerate(arrays.values()):
+            np.save(os.path.join(temp_dir, f'{i}.npy'), array, allow_pickle=False)
+        with open(os.path.join(temp_dir, 'columns.json'), 'w') as file:
+            json.dump(list(arrays.keys()), file)
+        try:
+            os.replace(temp_dir, entry_dir)
+        except OSError:
+            # another process has written the same entry
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        # remove the entries of previous versions of the file
+        for identity in os.listdir(file_dir):
+            if os.path.join(file_dir, identity) != identity_dir:
+                shutil.rmtree(os.path.join(file_dir, identity), ignore_errors=True)
+
+    def clear(self):
+        """ Remove all entries of the cache."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+
+def get_nbytes(value: Any) -> int:
+    """
+    Estimate the memory used by a dataset element.
+
+    Args:
+        value: numpy array, torch tensor, dataframe or tuple/list of them
+
+    Returns:
+        Number of bytes used by the data of `value`
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(get_nbytes(v) for v in value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return int(getattr(value, 'nbytes', 0))
+
+
+class LRUCache:
+
+    def __init__(self, max_bytes: int):
+        """
+        In-memory cache bounded by a number of bytes. When the cache is full, the least recently used items are
+        evicted. Items bigger than `max_bytes` are not cached.
+
+        Args:
+            max_bytes: maximum number of bytes of the cached items (see `get_nbytes`)
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key: Hashable):
+        return key in self._items
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get an item from the cache and mark it as the most recently used.
+
+        Args:
+            key: key of the item
+
+        Returns:
+            The cached item or None if the item is not in the cache
+        """
+        if key not in self._items:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return self._items[key][0]
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Add an item to the cache, evicting the least recently used items if needed.
+
+        Args:
+            key: key of the item
+            value: item to cache
+        """
+        nbytes = get_nbytes(value)
+        if key in self._items:
+            self.nbytes -= self._items.pop(key)[1]
+        if nbytes > self.max_bytes:
+            return
+        while self.nbytes + nbytes > self.max_bytes:
+            _, (_, evicted_nbytes) = self._items.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+        self._items[key] = (value, nbytes)
+        self.nbytes += nbytes
+
+    def clear(self):
+        """ Remove all items and reset the hit and miss counts."""
+        self._items.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
@@ -125,3 +125,22 @@ class TestAnnotation(TestCase):
         assert (result_df['ClearAirway'].to_list() == original_df['ClearAirway'].to_list())
         assert (result_df['Hypopnea'].to_list() == original_df['Hypopnea'].to_list())
 
+        # channel ids (.value) are merged as ChannelID
+        result_values_df = generate_annotations(original_df,
+                                                length_event='4S',
+                                                output_events_merge=[ChannelID.CPAP_ClearAirway.value,
+                                                                     ChannelID.CPAP_Hypopnea.value])
+        assert (result_values_df['ApneaEvent'].to_list() == result_df['ApneaEvent'].to_list())
+
+
+    def test_generate_annotation_entire_event_unsorted_index(self):
+        rows, cols = 20, 1
+        data = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 23, 0]
+        tidx = pd.date_range('2019-01-01', periods=rows, freq='S')
+        original_df = pd.DataFrame(data,
+                                   columns=['Obstructive'], index=tidx)
+        expected_df = generate_annotations(original_df, length_event='10S')
+
+        result_df = generate_annotations(original_df.iloc[::-1], length_event='10S')
+
+        assert (result_df['ApneaEvent'].to_list() == expected_df['ApneaEvent'].to_list()[::-1])
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from pyapnea.utils.cache import DiskCache, LRUCache
+
+
+class TestLRUCache(TestCase):
+
+    def test_eviction(self):
+        cache = LRUCache(max_bytes=300)
+        for key in range(3):
+            cache.put(key, np.zeros(10, dtype=np.float64))  # 80 bytes each
+        self.assertEqual(240, cache.nbytes)
+
+        # 0 becomes the most recently used, so 1 is evicted first
+        self.assertIsNotNone(cache.get(0))
+        cache.put(3, np.zeros(10, dtype=np.float64))
+        self.assertNotIn(1, cache)
+        self.assertIn(0, cache)
+        self.assertEqual(240, cache.nbytes)
+
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_too_big_item(self):
+        cache = LRUCache(max_bytes=100)
+        cache.put(0, (np.zeros(10, dtype=np.float64), np.zeros(10, dtype=np.float64)))
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.nbytes)
+
+
+class TestDiskCache(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.filename = os.path.join(self.temp_dir.name, 'session.001')
+        with open(self.filename, 'wb') as file:
+            file.write(b'session')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parameters(self):
+        # caches with different parameters sharing a directory do not evict each other
+        cache_10s = DiskCache(self.cache_dir, {'length_event': '10s'})
+        cache_none = DiskCache(self.cache_dir, {'length_event': None})
+        cache_10s.put(self.filename, {'a': np.arange(3)})
+        cache_none.put(self.filename, {'a': np.arange(4)})
+        np.testing.assert_array_equal(np.arange(3), cache_10s.get(self.filename)['a'])
+        np.testing.assert_array_equal(np.arange(4), cache_none.get(self.filename)['a'])
+
+    def test_modified_file(self):
+        cache = DiskCache(self.cache_dir)
+        cache.put(self.filename, {'a': np.arange(3)})
+        with open(self.filename, 'ab') as file:
+            file.write(b' modified')
+        self.assertIsNone(cache.get(self.filename))
+
+        # entries of the previous version are removed
+        cache.put(self.filename, {'a': np.arange(4)})
+        file_dir = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        self.assertEqual(1, len(os.listdir(file_dir)))
+        np.testing.assert_array_equal(np.arange(4), cache.get(self.filename)['a'])
+
+    def test_removed_entry(self):
+        cache = DiskCache(self.cache_dir)
+        cache.put(self.filename, {'a': np.arange(3), 'b': np.arange(3)})
+        # entry removed by another process while it is read
+        _, _, entry_dir = cache._get_entry_path(self.filename)
+        os.remove(os.path.join(entry_dir, '1.npy'))
+        self.assertIsNone(cache.get(self.filename))
+        shutil.rmtree(entry_dir)
+        self.assertIsNone(cache.get(self.filename))
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+
+class TestImport(TestCase):
+
+    def test_import_without_pandas_and_torch(self):
+        code = 'import sys, pyapnea; print("pandas" in sys.modules, "torch" in sys.modules)'
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                env=env).stdout
+        self.assertEqual('False False', output.strip())
+
+    def test_lazy_names(self):
+        import pyapnea
+        from pyapnea.oscar.oscar_getter import event_data_to_dataframe
+        from pyapnea.pytorch import RawOscarDataset
+        from pyapnea.utils.cache import LRUCache
+
+        self.assertIs(event_data_to_dataframe, pyapnea.event_data_to_dataframe)
+        self.assertIs(event_data_to_dataframe, pyapnea.oscar.event_data_to_dataframe)
+        self.assertIs(RawOscarDataset, pyapnea.RawOscarDataset)
+        self.assertIs(LRUCache, pyapnea.LRUCache)
+        self.assertIs(LRUCache, pyapnea.utils.LRUCache)
+        # every name exported by a subpackage is exported by pyapnea
+        self.assertTrue(set(pyapnea.pytorch.__all__ + pyapnea.utils.__all__).issubset(dir(pyapnea)))
+        self.assertIn('event_data_to_dataframe', dir(pyapnea))
+        with self.assertRaises(AttributeError):
+            pyapnea.unknown_name
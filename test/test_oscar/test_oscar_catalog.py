@@ -0,0 +1,72 @@
+import os
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+
+from pyapnea.oscar.oscar_catalog import OSCARCatalog
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_loader import load_session, load_session_metadata
+
+
+class TestOscarCatalog(TestCase):
+    data_path = '../data/raw'
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.catalog = OSCARCatalog(os.path.join(self.temp_dir.name, 'catalog.db'))
+
+    def tearDown(self):
+        self.catalog.close()
+        self.temp_dir.cleanup()
+
+    def test_load_session_metadata(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        expected_session = load_session(filename)
+        oscar_session_data = load_session_metadata(filename)
+
+        self.assertEqual(expected_session.header, oscar_session_data.header)
+        self.assertListEqual([(c.code, [e.evcount for e in c.events]) for c in expected_session.data.channels],
+                             [(c.code, [e.evcount for e in c.events]) for c in oscar_session_data.data.channels])
+        self.assertEqual(0, len(oscar_session_data.data.channels[0].events[0].data))
+
+    def test_update(self):
+        self.assertEqual(2, self.catalog.update(self.data_path))
+        # unchanged files are not scanned again
+        self.assertEqual(0, self.catalog.update(self.data_path))
+        self.assertEqual(2, len(self.catalog.find_sessions()))
+
+        filename = os.path.join(self.data_path, 'ResMed_1234567890', 'Events', '63c6e928.001')
+        session = self.catalog.get_session(filename)
+        self.assertEqual(1673980203000, session['sfirst'])
+        self.assertEqual(1673981224000, session['slast'])
+        self.assertEqual(17, len(self.catalog.get_channels(filename)))
+        events = self.catalog.get_events(filename, ChannelID.CPAP_Te.value)
+        self.assertEqual(1, len(events))
+        self.assertEqual(327, events[0]['evcount'])
+        self.assertEqual(1673980205440, events[0]['ts1'])
+
+    def test_find_sessions(self):
+        self.catalog.update(self.data_path)
+        filename = os.path.abspath(os.path.join(self.data_path, 'ResMed_1234567890', 'Events', '63c6e928.001'))
+
+        self.assertListEqual([filename], self.catalog.find_sessions(start=1673980000000, end=1673980300000))
+        # naive datetimes are UTC
+        self.assertListEqual([filename], self.catalog.find_sessions(start=datetime(2023, 1, 17, 18, 30),
+                                                                    end=datetime(2023, 1, 17, 18, 31)))
+        self.assertListEqual([], self.catalog.find_sessions(start=1673981225000, end=1673990000000))
+        self.assertEqual(2, len(self.catalog.find_sessions(channel_ids=[ChannelID.CPAP_FlowRate.value])))
+        self.assertListEqual([], self.catalog.find_sessions(channel_ids=[ChannelID.OXI_SPO2.value]))
+
+    def test_update_other_directory(self):
+        self.catalog.update(self.data_path)
+        data_path = os.path.abspath(self.data_path)
+        current_dir = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            # files scanned from another directory are the same files
+            self.assertEqual(0, self.catalog.update(data_path))
+        finally:
+            os.chdir(current_dir)
+        self.assertEqual(2, len(self.catalog.find_sessions()))
+        self.assertIsNotNone(self.catalog.get_session(os.path.join(self.data_path, 'ResMed_1234567890', 'Events',
+                                                                   '63c6e928.001')))
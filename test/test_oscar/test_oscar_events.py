@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pyapnea import ChannelID
+from pyapnea.oscar.oscar_events import EventIntervals, EventIndex, load_event_intervals
+from pyapnea.oscar.oscar_loader import load_session
+
+
+class TestOscarEvents(TestCase):
+
+    def test_load_event_intervals(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        intervals = load_event_intervals(filename)
+        oscar_session_data = load_session(filename)
+
+        expected_intervals = EventIntervals.from_session(oscar_session_data)
+        for name in ['start', 'end', 'type', 'value']:
+            np.testing.assert_array_equal(getattr(expected_intervals, name), getattr(intervals, name))
+        # 9 clear airway events, the hypopnea flag has a value of 0
+        self.assertEqual(9, len(intervals))
+        self.assertTrue(np.all(intervals.type == ChannelID.CPAP_ClearAirway.value))
+        self.assertTrue(np.all(np.diff(intervals.end) >= 0))
+        np.testing.assert_array_equal(intervals.end - intervals.start, np.round(intervals.value * 1000))
+        self.assertEqual(0, len(intervals.select([ChannelID.CPAP_Hypopnea])))
+
+    def test_overlapping(self):
+        intervals = EventIntervals(start=np.array([0, 5000, 8000]), end=np.array([10000, 12000, 30000]),
+                                   type=np.array([1, 2, 1]), value=np.array([10.0, 7.0, 22.0]), max_duration=22000)
+
+        np.testing.assert_array_equal([0, 1], intervals.overlapping(1000, 6000))
+        np.testing.assert_array_equal([2], intervals.overlapping(13000, 14000))
+        np.testing.assert_array_equal([0, 1, 2], intervals.overlapping(10000, 10000))
+        np.testing.assert_array_equal([], intervals.overlapping(31000, 40000))
+
+    def test_labels(self):
+        intervals = EventIntervals(start=np.array([2000, 3000]), end=np.array([4000, 8000]),
+                                   type=np.array([1, 1]), value=np.array([2.0, 5.0]), max_duration=5000)
+        times = np.arange(0, 10000, 1000)
+
+        np.testing.assert_array_equal([0, 0, 1, 1, 1, 1, 1, 1, 1, 0], intervals.labels(times))
+        np.testing.assert_array_equal([0, 0, 0, 1, 1, 0, 0, 1, 1, 0], intervals.labels(times, length=1000))
+        np.testing.assert_array_equal([0, 1, 1, 0], intervals.labels(times[[9, 4, 3, 0]]))
+
+    def test_event_index(self):
+        filenames = ['../data/raw/ResMed_1234567890/Events/61f5f33c.001',
+                     '../data/raw/ResMed_1234567890/Events/63c6e928.001']
+        index = EventIndex(filenames)
+        np.testing.assert_array_equal([9, 0], index.nb_events())
+        np.testing.assert_array_equal([True, False], index.contains_event())
+        self.assertEqual(0.5, index.class_balance())
+
+        # one clear airway event is not at the time of a FlowRate sample
+        index = EventIndex(filenames, reference_channel_id=ChannelID.CPAP_FlowRate.value)
+        np.testing.assert_array_equal([8, 0], index.nb_events())
+
+        intervals = index.intervals[0]
+        starts = np.array([intervals.start[0] - 1000, intervals.end[-1] + 1])
+        counts = index.window_counts(0, starts, starts + 1000)
+        np.testing.assert_array_equal([1, 0], counts)
+        self.assertEqual(0.5, index.class_balance(counts))
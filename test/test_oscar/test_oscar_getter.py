@@ -1,6 +1,8 @@
 from unittest import TestCase
 from datetime import datetime, timezone
 
+import pandas as pd
+
 from pyapnea.oscar.oscar_loader import load_session
 from pyapnea import get_channel_from_code, event_data_to_dataframe
 from pyapnea import ChannelID
@@ -98,4 +100,80 @@ class TestOscarSessionGetter(TestCase):
                                      {ChannelID.CPAP_FlowRate.value: -1000.0})
 
         self.assertEqual(nb_flowrate_points+1, len(df))
-        self.assertFalse(df['FlowRate'].isna().any())
\ No newline at end of file
+        self.assertFalse(df['FlowRate'].isna().any())
+
+    def test_data_to_dataframe_from_filename(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        channel_ids = [ChannelID.CPAP_ClearAirway.value, ChannelID.CPAP_FlowRate.value]
+        expected_df = event_data_to_dataframe(load_session(filename), channel_ids)
+        df = event_data_to_dataframe(filename, channel_ids)
+
+        self.assertTrue(expected_df.equals(df))
+
+    def test_data_to_dataframe_same_as_merge(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        oscar_session_data = load_session(filename)
+        # Leak has several samples with the same time: rows are the cartesian product as in an outer merge
+        channel_ids = [ChannelID.CPAP_Leak.value, ChannelID.CPAP_Pressure.value, ChannelID.CPAP_Obstructive.value]
+        expected_df = None
+        for channel_id in channel_ids:
+            df = event_data_to_dataframe(oscar_session_data, [channel_id])
+            expected_df = df if expected_df is None else pd.merge(expected_df, df, on='time_utc', how='outer')
+        df = event_data_to_dataframe(oscar_session_data, channel_ids)
+
+        self.assertListEqual(expected_df.columns.to_list(), df.columns.to_list())
+        pd.testing.assert_frame_equal(expected_df.reset_index(drop=True), df.reset_index(drop=True))
+
+    def test_data_to_dataframe_align_to_channel(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        oscar_session_data = load_session(filename)
+        flowrate_df = event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_FlowRate.value])
+        pressure_df = event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_Pressure.value])
+        expected_df = pd.merge_asof(flowrate_df.sort_values('time_utc'), pressure_df.sort_values('time_utc'),
+                                    on='time_utc', tolerance=pd.Timedelta('1s'))
+
+        df = event_data_to_dataframe(oscar_session_data,
+                                     [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_Pressure.value],
+                                     align_to=ChannelID.CPAP_FlowRate.value,
+                                     tolerance=1000)
+
+        self.assertEqual(len(flowrate_df), len(df))
+        pd.testing.assert_series_equal(expected_df['Pressure'], df['Pressure'])
+        pd.testing.assert_series_equal(expected_df['FlowRate'], df['FlowRate'])
+
+    def test_data_to_dataframe_align_period(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        leak_df = event_data_to_dataframe(filename, [ChannelID.CPAP_Leak.value])
+
+        df = event_data_to_dataframe(filename, [ChannelID.CPAP_Leak.value], align_period=60000,
+                                     align_method='interpolate')
+
+        self.assertListEqual(['time_utc', 'Leak'], df.columns.to_list())
+        self.assertTrue((df['time_utc'].diff().dropna() == pd.Timedelta('1min')).all())
+        self.assertEqual(leak_df['time_utc'].min(), df.loc[0, 'time_utc'])
+        self.assertFalse(df['Leak'].isna().all())
+
+        # channels not requested are not decoded, even unknown ones
+        oscar_session_data = load_session(filename)
+        get_channel_from_code(oscar_session_data, ChannelID.CPAP_Te.value).code = 0x9999
+        pd.testing.assert_frame_equal(df, event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_Leak.value],
+                                                                  align_period=60000, align_method='interpolate'))
+
+    def test_data_to_dataframe_align_methods(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        oscar_session_data = load_session(filename)
+        clear_airway_df = event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_ClearAirway.value])
+        flowrate_df = event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_FlowRate.value])
+        # events recorded while FlowRate is recorded
+        expected_nb_events = clear_airway_df['time_utc'].isin(flowrate_df['time_utc']).sum()
+
+        df = event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_ClearAirway.value],
+                                     align_to=ChannelID.CPAP_FlowRate.value,
+                                     align_method={ChannelID.CPAP_ClearAirway.value: 'nearest'},
+                                     tolerance=0)
+
+        self.assertEqual(len(flowrate_df), len(df))
+        self.assertEqual(expected_nb_events, df['ClearAirway'].notna().sum())
+        with self.assertRaises(ValueError):
+            event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_ClearAirway.value],
+                                    align_to=ChannelID.CPAP_FlowRate.value, align_method='spline')
@@ -0,0 +1,82 @@
+import os
+import tempfile
+from importlib.util import find_spec
+from unittest import TestCase, skipIf
+
+import numpy as np
+
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_getter import event_data_to_dataframe
+from pyapnea.oscar.oscar_hdf import convert_to_hdf, list_hdf_sessions, read_hdf_channel, read_hdf_channels, \
+    write_session_to_hdf
+from pyapnea.oscar.oscar_loader import load_session
+
+
+@skipIf(find_spec('h5py') is None, 'h5py is not installed')
+class TestOscarHdf(TestCase):
+    data_path = '../data/raw'
+    filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.hdf_filename = os.path.join(self.temp_dir.name, 'profile.h5')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_convert(self):
+        self.assertEqual(2, convert_to_hdf(self.data_path, self.hdf_filename, chunk_size=100))
+        # sessions already converted are not converted again, whatever the form of the data path
+        self.assertEqual(0, convert_to_hdf(self.data_path, self.hdf_filename, chunk_size=100))
+        self.assertEqual(0, convert_to_hdf(os.path.abspath(self.data_path), self.hdf_filename, chunk_size=100))
+
+        sessions = list_hdf_sessions(self.hdf_filename)
+        self.assertEqual(2, len(sessions))
+        self.assertIn(ChannelID.CPAP_FlowRate.value, sessions.loc[0, 'channels'])
+
+    def test_read_channel(self):
+        convert_to_hdf(self.data_path, self.hdf_filename, chunk_size=100)
+        session = list_hdf_sessions(self.hdf_filename).set_index('source').loc[os.path.abspath(self.filename)]
+        expected_df = event_data_to_dataframe(self.filename, [ChannelID.CPAP_FlowRate.value])
+        expected_df = expected_df.sort_values('time_utc', kind='stable', ignore_index=True)
+
+        df = read_hdf_channel(self.hdf_filename, session['deviceid'], session['sessionid'],
+                              ChannelID.CPAP_FlowRate.value)
+        self.assertListEqual(['time_utc', 'FlowRate'], df.columns.to_list())
+        self.assertTrue(expected_df['time_utc'].equals(df['time_utc']))
+        np.testing.assert_allclose(expected_df['FlowRate'], df['FlowRate'], rtol=1e-6)
+
+        start = expected_df['time_utc'].iloc[1234]
+        end = expected_df['time_utc'].iloc[5678]
+        df = read_hdf_channel(self.hdf_filename, session['deviceid'], session['sessionid'],
+                              ChannelID.CPAP_FlowRate.value,
+                              start=int(start.timestamp() * 1000), end=int(end.timestamp() * 1000))
+        self.assertEqual(5678 - 1234, len(df))
+        self.assertEqual(start, df['time_utc'].iloc[0])
+
+    def test_read_channels(self):
+        convert_to_hdf(self.data_path, self.hdf_filename)
+        session = list_hdf_sessions(self.hdf_filename).set_index('source').loc[os.path.abspath(self.filename)]
+
+        df = read_hdf_channels(self.hdf_filename, session['deviceid'], session['sessionid'],
+                               [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_ClearAirway.value,
+                                ChannelID.OXI_SPO2.value])
+        self.assertListEqual(['time_utc', 'FlowRate', 'ClearAirway'], df.columns.to_list())
+        df = read_hdf_channels(self.hdf_filename, session['deviceid'], session['sessionid'],
+                               [ChannelID.OXI_SPO2.value])
+        self.assertListEqual(['no_channel'], df.columns.to_list())
+
+    def test_write_unknown_channel(self):
+        import h5py
+        oscar_session_data = load_session(self.filename, channels=[ChannelID.CPAP_Te.value])
+        expected_values = np.concatenate([evt.data * np.float32(evt.gain)
+                                          for evt in oscar_session_data.data.channels[0].events])
+        # channel id not in CHANNEL_NAMES
+        oscar_session_data.data.channels[0].code = 0x9999
+        with h5py.File(self.hdf_filename, 'w') as hdf_file:
+            write_session_to_hdf(oscar_session_data, hdf_file, source=self.filename)
+
+        header = oscar_session_data.header
+        df = read_hdf_channel(self.hdf_filename, header.deviceid, header.sessionid, 0x9999)
+        self.assertListEqual(['time_utc', str(0x9999)], df.columns.to_list())
+        np.testing.assert_allclose(np.sort(expected_values), np.sort(df[str(0x9999)].to_numpy()))
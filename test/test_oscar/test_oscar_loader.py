@@ -1,7 +1,17 @@
-from unittest import TestCase
+import os
+import struct
+import tempfile
+import zlib
+from unittest import TestCase, skipUnless
 
 from dataclasses import asdict
-from pyapnea.oscar.oscar_loader import read_session
+
+import numpy as np
+
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.profiling import enable_profiling, get_profile
+from pyapnea.oscar.oscar_loader import read_session, load_session, load_session_metadata, load_sessions, \
+    load_session_layout
 
 expected_oscar_data_dict = {'header': {'magicnumber': 3341948587,
                                        'version': 10,
@@ -143,6 +153,9 @@ class TestOscarSessionLoader(TestCase):
         oscar_session_data.data.channels = [oscar_session_data.data.channels[0]]
         oscar_session_data.data.channels[0].events = [oscar_session_data.data.channels[0].events[0]]
         oscar_session_data_dict = asdict(oscar_session_data)
+        for event in oscar_session_data_dict['data']['channels'][0]['events']:
+            for array_name in ['data', 'data2', 'time']:
+                event[array_name] = event[array_name].tolist()
 
         self.assertDictEqual(expected_oscar_data_dict, oscar_session_data_dict)
 
@@ -154,6 +167,137 @@ class TestOscarSessionLoader(TestCase):
             position, oscar_session_data = read_session(data, position)
             self._test(oscar_session_data)
 
+    def test_read_session_numpy_types(self):
+        filename = '../data/raw/ResMed_1234567890/Events/63c6e928.001'
+        with open(filename, mode='rb') as file:
+            data = file.read()
+            position, oscar_session_data = read_session(data, 0)
+        event = oscar_session_data.data.channels[0].events[0]
+        self.assertEqual(np.int16, event.data.dtype)
+        self.assertEqual(np.uint32, event.time.dtype)
+        self.assertEqual(event.evcount, len(event.data))
+        self.assertEqual(event.evcount, len(event.time))
+
+    def test_load_session_mmap(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        expected_session = load_session(filename)
+        oscar_session_data = load_session(filename, use_mmap=True)
+
+        self.assertEqual(expected_session.header, oscar_session_data.header)
+        self.assertEqual(len(expected_session.data.channels), len(oscar_session_data.data.channels))
+        for expected_channel, channel in zip(expected_session.data.channels, oscar_session_data.data.channels):
+            self.assertEqual(expected_channel.code, channel.code)
+            for expected_event, event in zip(expected_channel.events, channel.events):
+                np.testing.assert_array_equal(expected_event.data, event.data)
+                np.testing.assert_array_equal(expected_event.time, event.time)
+                # arrays are views on the mapping, not copies
+                self.assertFalse(event.data.flags.owndata)
+                self.assertFalse(event.data.flags.writeable)
+
+    def test_load_session_channels(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        expected_session = load_session(filename)
+        channels = [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_ClearAirway.value]
+        oscar_session_data = load_session(filename, channels=channels)
+
+        self.assertEqual(len(channels), oscar_session_data.data.mcsize)
+        expected_channels = [c for c in expected_session.data.channels if c.code in channels]
+        self.assertListEqual([c.code for c in expected_channels], [c.code for c in oscar_session_data.data.channels])
+        for expected_channel, channel in zip(expected_channels, oscar_session_data.data.channels):
+            for expected_event, event in zip(expected_channel.events, channel.events):
+                np.testing.assert_array_equal(expected_event.data, event.data)
+                np.testing.assert_array_equal(expected_event.time, event.time)
 
+    def test_load_session_no_channel(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        oscar_session_data = load_session(filename, channels=[])
+        self.assertListEqual([], oscar_session_data.data.channels)
 
+    def test_load_session_compressed(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        with open(filename, mode='rb') as file:
+            data = file.read()
+        # build a compressed session file as OSCAR does (qCompress of the data after the header)
+        header_size = struct.calcsize('IHHIIqqHHIH')
+        header = bytearray(data[:header_size])
+        struct.pack_into('H', header, struct.calcsize('IHHIIqq'), 1)
+        session_data = data[header_size:]
+        compressed_data = bytes(header) + struct.pack('>I', len(session_data)) + zlib.compress(session_data)
+
+        expected_session = load_session(filename)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            compressed_filename = os.path.join(temp_dir, '61f5f33c.001')
+            with open(compressed_filename, mode='wb') as file:
+                file.write(compressed_data)
+            for use_mmap in [False, True]:
+                oscar_session_data = load_session(compressed_filename, use_mmap=use_mmap)
+                self.assertEqual(1, oscar_session_data.header.compmethod)
+                self.assertEqual(len(expected_session.data.channels), len(oscar_session_data.data.channels))
+                for expected_channel, channel in zip(expected_session.data.channels, oscar_session_data.data.channels):
+                    for expected_event, event in zip(expected_channel.events, channel.events):
+                        np.testing.assert_array_equal(expected_event.data, event.data)
+                        np.testing.assert_array_equal(expected_event.time, event.time)
+            enable_profiling()
+            try:
+                oscar_session_metadata = load_session_metadata(compressed_filename)
+                decompressed_bytes = get_profile()['oscar_loader.decompress']['bytes']
+            finally:
+                enable_profiling(False)
+            self.assertListEqual([(c.code, [(e.ts1, e.evcount) for e in c.events])
+                                  for c in expected_session.data.channels],
+                                 [(c.code, [(e.ts1, e.evcount) for e in c.events])
+                                  for c in oscar_session_metadata.data.channels])
+            # only the beginning of the session data containing the metadata is decompressed
+            self.assertLessEqual(decompressed_bytes, 1 << 16)
+            self.assertLess(decompressed_bytes, len(session_data) // 10)
+
+    def test_event_implicit_time(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        oscar_session_data = load_session(filename, channels=[ChannelID.CPAP_FlowRate.value])
+        event = oscar_session_data.data.channels[0].events[0]
+
+        self.assertFalse(hasattr(event, '__dict__'))
+        self.assertEqual(0, event.t8)
+        self.assertEqual(0, len(event.time))
+        time = event.get_time()
+        self.assertEqual(event.evcount, len(time))
+        self.assertListEqual([0, int(event.rate), 2 * int(event.rate)], time[:3].tolist())
+
+    def test_load_sessions(self):
+        filenames = ['../data/raw/ResMed_1234567890/Events/61f5f33c.001',
+                     '../data/raw/ResMed_1234567890/Events/63c6e928.001']
+        for workers in [1, 2]:
+            list_sessions = load_sessions(filenames, workers=workers)
+            self.assertEqual(len(filenames), len(list_sessions))
+            for filename, oscar_session_data in zip(filenames, list_sessions):
+                expected_session = load_session(filename)
+                self.assertEqual(expected_session.header, oscar_session_data.header)
+                for expected_channel, channel in zip(expected_session.data.channels, oscar_session_data.data.channels):
+                    self.assertEqual(expected_channel.code, channel.code)
+                    for expected_event, event in zip(expected_channel.events, channel.events):
+                        np.testing.assert_array_equal(expected_event.data, event.data)
+                        np.testing.assert_array_equal(expected_event.time, event.time)
+                        self.assertEqual(expected_event.data.dtype, event.data.dtype)
+
+    @skipUnless(os.path.isdir('/dev/shm'), 'shared memory blocks are not listed in /dev/shm')
+    def test_load_sessions_missing_file(self):
+        filenames = ['../data/raw/ResMed_1234567890/Events/61f5f33c.001',
+                     '../data/raw/ResMed_1234567890/Events/missing.001',
+                     '../data/raw/ResMed_1234567890/Events/63c6e928.001']
+        shm_blocks = set(os.listdir('/dev/shm'))
+        with self.assertRaises(FileNotFoundError):
+            load_sessions(filenames, workers=2)
+        self.assertSetEqual(shm_blocks, set(os.listdir('/dev/shm')))
+
+    def test_load_session_layout(self):
+        filename = '../data/raw/ResMed_1234567890/Events/61f5f33c.001'
+        expected_session = load_session(filename)
+        oscar_session_data, data_positions = load_session_layout(filename)
+        with open(filename, mode='rb') as file:
+            data = file.read()
 
+        for channel in expected_session.data.channels:
+            self.assertEqual(len(channel.events), len(data_positions[channel.code]))
+            for event, data_position in zip(channel.events, data_positions[channel.code]):
+                samples = np.frombuffer(data, dtype=np.int16, count=event.evcount, offset=data_position)
+                np.testing.assert_array_equal(event.data, samples)
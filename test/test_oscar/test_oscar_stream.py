@@ -0,0 +1,132 @@
+import io
+import os
+import threading
+import tracemalloc
+from unittest import TestCase
+
+import numpy as np
+
+from pyapnea.oscar.data_structure import OSCARSessionHeader, OSCARSessionData, OSCARSessionChannel
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_loader import load_session
+from pyapnea.oscar.oscar_stream import iter_session_stream, read_session_stream, OSCARSampleChunk
+from pyapnea.oscar.oscar_writer import write_session
+
+
+class _ShortReads:
+    """ File-like object returning fewer bytes than requested, as a pipe or a socket."""
+
+    def __init__(self, data: bytes, max_size: int):
+        self.file = io.BytesIO(data)
+        self.max_size = max_size
+
+    def read(self, size: int) -> bytes:
+        return self.file.read(min(size, self.max_size))
+
+
+class TestOscarStream(TestCase):
+    filenames = ['../data/raw/ResMed_1234567890/Events/61f5f33c.001',
+                 '../data/raw/ResMed_1234567890/Events/63c6e928.001']
+
+    def _assert_same_session(self, expected_session, oscar_session_data):
+        self.assertEqual(expected_session.header, oscar_session_data.header)
+        self.assertEqual(expected_session.data.mcsize, oscar_session_data.data.mcsize)
+        self.assertListEqual([c.code for c in expected_session.data.channels],
+                             [c.code for c in oscar_session_data.data.channels])
+        for expected_channel, channel in zip(expected_session.data.channels, oscar_session_data.data.channels):
+            self.assertEqual(expected_channel.size2, channel.size2)
+            for expected_event, event in zip(expected_channel.events, channel.events):
+                self.assertEqual(expected_event.ts1, event.ts1)
+                self.assertEqual(expected_event.dim, event.dim)
+                for name in ['data', 'data2', 'time']:
+                    self.assertEqual(getattr(expected_event, name).dtype, getattr(event, name).dtype)
+                    np.testing.assert_array_equal(getattr(expected_event, name), getattr(event, name))
+
+    def test_read_session_stream(self):
+        for filename in self.filenames:
+            expected_session = load_session(filename)
+            for chunk_size in [16, 1000, 1 << 16]:
+                with open(filename, mode='rb') as file:
+                    self._assert_same_session(expected_session, read_session_stream(file, chunk_size=chunk_size))
+            with open(filename, mode='rb') as file:
+                data = file.read()
+            self._assert_same_session(expected_session, read_session_stream(_ShortReads(data, 7), chunk_size=64))
+
+    def test_read_session_stream_compressed(self):
+        filename = self.filenames[1]
+        expected_session = load_session(filename)
+        data = write_session(expected_session, compress=True)
+        oscar_session_data = read_session_stream(_ShortReads(data, 100), chunk_size=128)
+        self.assertEqual(1, oscar_session_data.header.compmethod)
+        expected_session.header.compmethod = 1
+        self._assert_same_session(expected_session, oscar_session_data)
+
+    def test_read_session_stream_channels(self):
+        filename = self.filenames[0]
+        channels = [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_ClearAirway.value]
+        with open(filename, mode='rb') as file:
+            oscar_session_data = read_session_stream(file, channels=channels)
+        self._assert_same_session(load_session(filename, channels=channels), oscar_session_data)
+
+    def test_read_session_stream_pipe(self):
+        filename = self.filenames[1]
+        with open(filename, mode='rb') as file:
+            data = file.read()
+        read_fd, write_fd = os.pipe()
+
+        def write():
+            try:
+                view = memoryview(data)
+                while len(view) > 0:
+                    view = view[os.write(write_fd, view):]
+            finally:
+                # the reader gets the end of the stream even if writing fails
+                os.close(write_fd)
+
+        thread = threading.Thread(target=write, daemon=True)
+        thread.start()
+        try:
+            with os.fdopen(read_fd, mode='rb', buffering=0) as pipe:
+                oscar_session_data = read_session_stream(pipe, chunk_size=4096)
+        finally:
+            thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self._assert_same_session(load_session(filename), oscar_session_data)
+
+    def test_iter_session_stream(self):
+        filename = self.filenames[0]
+        chunk_size = 4096
+        expected_session = load_session(filename)
+        with open(filename, mode='rb') as file:
+            items = list(iter_session_stream(file, chunk_size=chunk_size))
+        nb_channels = len(expected_session.data.channels)
+
+        self.assertIsInstance(items[0], OSCARSessionHeader)
+        self.assertIsInstance(items[1], OSCARSessionData)
+        self.assertTrue(all(isinstance(item, OSCARSessionChannel) for item in items[2:2 + nb_channels]))
+        chunks = items[2 + nb_channels:]
+        self.assertTrue(all(isinstance(item, OSCARSampleChunk) for item in chunks))
+        self.assertTrue(all(item.values.nbytes <= chunk_size for item in chunks))
+        flowrate_chunks = [item for item in chunks if item.code == ChannelID.CPAP_FlowRate.value and item.event == 0]
+        np.testing.assert_array_equal(expected_session.data.channels[9].events[0].data,
+                                      np.concatenate([item.values for item in flowrate_chunks]))
+
+    def test_iter_session_stream_memory(self):
+        filename = self.filenames[0]
+        chunk_size = 4096
+        with open(filename, mode='rb') as file:
+            tracemalloc.start()
+            try:
+                nb_bytes = sum(item.values.nbytes for item in iter_session_stream(file, chunk_size=chunk_size)
+                               if isinstance(item, OSCARSampleChunk))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        self.assertGreater(nb_bytes, 1000000)
+        self.assertLess(peak, 100000)
+
+    def test_iter_session_stream_truncated(self):
+        with open(self.filenames[1], mode='rb') as file:
+            data = file.read()
+        with self.assertRaises(EOFError):
+            read_session_stream(io.BytesIO(data[:len(data) // 2]))
@@ -0,0 +1,103 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_getter import event_data_to_dataframe
+from pyapnea.oscar.oscar_loader import load_session, load_session_metadata
+from pyapnea.oscar.oscar_writer import write_session, save_session, trim_session
+
+
+class TestOscarWriter(TestCase):
+    filenames = ['../data/raw/ResMed_1234567890/Events/61f5f33c.001',
+                 '../data/raw/ResMed_1234567890/Events/63c6e928.001']
+
+    def _assert_same_samples(self, expected_session, oscar_session_data):
+        self.assertListEqual([c.code for c in expected_session.data.channels],
+                             [c.code for c in oscar_session_data.data.channels])
+        for expected_channel, channel in zip(expected_session.data.channels, oscar_session_data.data.channels):
+            self.assertEqual(len(expected_channel.events), len(channel.events))
+            for expected_event, event in zip(expected_channel.events, channel.events):
+                np.testing.assert_array_equal(expected_event.data, event.data)
+                np.testing.assert_array_equal(expected_event.get_time() + expected_event.ts1,
+                                              event.get_time() + event.ts1)
+
+    def _save(self, oscar_session):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        filename = os.path.join(temp_dir.name, 'session.001')
+        save_session(oscar_session, filename)
+        return filename
+
+    def test_write_session_roundtrip(self):
+        for filename in self.filenames:
+            with open(filename, mode='rb') as file:
+                data = file.read()
+            for use_mmap in [False, True]:
+                self.assertEqual(data, write_session(load_session(filename, use_mmap=use_mmap)))
+
+    def test_save_session_compressed(self):
+        filename = self.filenames[0]
+        expected_session = load_session(filename)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            compressed_filename = os.path.join(temp_dir, '61f5f33c.001')
+            save_session(expected_session, compressed_filename, compress=True)
+            self.assertLess(os.path.getsize(compressed_filename), os.path.getsize(filename))
+            oscar_session_data = load_session(compressed_filename)
+
+            self.assertEqual(1, oscar_session_data.header.compmethod)
+            self.assertEqual(expected_session.header.datasize, oscar_session_data.header.datasize)
+            self._assert_same_samples(expected_session, oscar_session_data)
+            # compressed again by default, and back to the original file when not compressed
+            self.assertEqual(os.path.getsize(compressed_filename), len(write_session(oscar_session_data)))
+            with open(filename, mode='rb') as file:
+                self.assertEqual(file.read(), write_session(oscar_session_data, compress=False))
+
+    def test_write_session_channels(self):
+        filename = self.filenames[0]
+        channels = [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_ClearAirway.value]
+        expected_session = load_session(filename, channels=channels)
+        for oscar_session in [expected_session, trim_session(load_session(filename), channel_ids=channels)]:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                compacted_filename = os.path.join(temp_dir, '61f5f33c.001')
+                save_session(oscar_session, compacted_filename)
+                oscar_session_data = load_session(compacted_filename)
+            self.assertEqual(len(channels), oscar_session_data.data.mcsize)
+            self._assert_same_samples(expected_session, oscar_session_data)
+
+    def test_trim_session(self):
+        filename = self.filenames[0]
+        expected_session = load_session(filename)
+        start = expected_session.header.sfirst + 600000
+        end = start + 600000
+        oscar_session = trim_session(expected_session, start=start, end=end)
+        oscar_session_data = load_session(self._save(oscar_session))
+
+        self.assertEqual(start, oscar_session_data.header.sfirst)
+        self.assertEqual(end, oscar_session_data.header.slast)
+        # no ClearAirway event in the time range: the channel is kept without events
+        clear_airway = next(c for c in oscar_session_data.data.channels if c.code == ChannelID.CPAP_ClearAirway.value)
+        self.assertEqual(0, clear_airway.size2)
+        channels = [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_Te.value, ChannelID.CPAP_Pressure.value]
+        expected_df = event_data_to_dataframe(expected_session, channels)
+        expected_df = expected_df[(expected_df['time_utc'] >= pd.to_datetime(start, unit='ms', utc=True)) &
+                                  (expected_df['time_utc'] < pd.to_datetime(end, unit='ms', utc=True))]
+        expected_df = expected_df.reset_index(drop=True)
+        df = event_data_to_dataframe(oscar_session_data, channels)
+        self.assertEqual(15000, len(df))
+        self.assertTrue(expected_df.equals(df))
+        for channel in oscar_session_data.data.channels:
+            for event in channel.events:
+                self.assertEqual(0, event.get_time()[0])
+                self.assertAlmostEqual(event.mn, float(np.float32(event.gain) * event.data.min()))
+
+    def test_write_session_metadata_only(self):
+        with self.assertRaises(ValueError):
+            write_session(load_session_metadata(self.filenames[1]))
+        oscar_session_data = load_session_metadata(self.filenames[1])
+        with self.assertRaises(ValueError):
+            trim_session(oscar_session_data, start=oscar_session_data.header.sfirst + 60000)
+
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase
+
+from torch.utils.data import DataLoader
+
+from pyapnea import ChannelID
+from pyapnea.oscar.oscar_getter import event_data_to_dataframe
+from pyapnea.oscar.oscar_loader import load_session
+from pyapnea.profiling import enable_profiling, get_profile, reset_profile, merge_profiles, load_profiles, \
+    format_profile, is_profiling_enabled
+from pyapnea.pytorch.raw_oscar_dataset import RawOscarDataset
+from pyapnea.utils.annotations import generate_annotations
+
+
+class TestProfiling(TestCase):
+    filename = 'data/raw/ResMed_1234567890/Events/63c6e928.001'
+
+    def tearDown(self):
+        enable_profiling(False)
+
+    def test_disabled(self):
+        enable_profiling(False)
+        load_session(self.filename)
+        self.assertFalse(is_profiling_enabled())
+        self.assertDictEqual({}, get_profile())
+
+    def test_stages(self):
+        enable_profiling()
+        oscar_session_data = load_session(self.filename)
+        df = event_data_to_dataframe(oscar_session_data, [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_Te.value],
+                                     mis_value_strategy={ChannelID.CPAP_FlowRate.value: 'ignore'})
+        generate_annotations(df.set_index('time_utc'), length_event='10s')
+        profile = get_profile()
+
+        self.assertEqual(os.path.getsize(self.filename), profile['oscar_loader.read_file']['bytes'])
+        self.assertEqual(42, profile['oscar_loader.header']['bytes'])
+        self.assertEqual(oscar_session_data.header.datasize,
+                         profile['oscar_loader.metadata']['bytes'] + profile['oscar_loader.decode']['bytes'])
+        self.assertEqual(len(oscar_session_data.data.channels), profile['oscar_loader.decode']['calls'])
+        for name in ['oscar_getter.build', 'oscar_getter.merge', 'oscar_getter.missing_values',
+                     'annotations.generate_annotations']:
+            self.assertEqual(1, profile[name]['calls'])
+            self.assertGreater(profile[name]['seconds'], 0)
+        self.assertIn('oscar_loader.decode', format_profile())
+
+        reset_profile()
+        self.assertDictEqual({}, get_profile())
+
+    def test_merge_profiles(self):
+        profile = {'stage': {'calls': 1, 'seconds': 0.5, 'bytes': 10}}
+        other_profile = {'stage': {'calls': 2, 'seconds': 0.25, 'bytes': 5},
+                         'other_stage': {'calls': 1, 'seconds': 1.0, 'bytes': 0}}
+        self.assertDictEqual({'stage': {'calls': 3, 'seconds': 0.75, 'bytes': 15},
+                              'other_stage': {'calls': 1, 'seconds': 1.0, 'bytes': 0}},
+                             merge_profiles([profile, other_profile]))
+
+    def test_dataloader_workers(self):
+        ds = RawOscarDataset(data_path='data/raw')
+        with tempfile.TemporaryDirectory() as output_dir:
+            enable_profiling(output_dir=output_dir)
+            for _ in DataLoader(ds, batch_size=None, num_workers=2):
+                pass
+            profile = load_profiles(output_dir)
+        # one file per worker, the main process did not load any element
+        self.assertEqual(len(ds), profile['RawOscarDataset.__getitem__']['calls'])
+        self.assertEqual(sum(os.path.getsize(f['fullpath']) for f in ds.list_files),
+                         profile['RawOscarDataset.__getitem__']['bytes'])
+        self.assertDictEqual({}, get_profile())
+
+    def test_environment_variable(self):
+        code = f'from pyapnea import load_session; load_session({self.filename!r})'
+        with tempfile.TemporaryDirectory() as output_dir:
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), PYAPNEA_PROFILE_DIR=output_dir)
+            subprocess.run([sys.executable, '-c', code], check=True, env=env)
+            profile = load_profiles(output_dir)
+        self.assertEqual(1, profile['oscar_loader.read_file']['calls'])
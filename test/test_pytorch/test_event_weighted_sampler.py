@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from pyapnea.pytorch.event_weighted_sampler import EventWeightedSampler
+from pyapnea.pytorch.raw_oscar_dataset import RawOscarDataset
+from pyapnea.pytorch.windowed_oscar_dataset import WindowedOscarDataset
+
+
+class TestEventWeightedSampler(TestCase):
+    def test_positive_ratio(self):
+        contains_event = [True] + [False] * 99
+        sampler = EventWeightedSampler(contains_event, positive_ratio=0.25, num_samples=20000,
+                                       generator=torch.Generator().manual_seed(0))
+        indexes = np.array(list(sampler))
+
+        self.assertEqual(20000, len(indexes))
+        self.assertAlmostEqual(0.25, np.mean(indexes == 0), delta=0.02)
+
+        # no positive: uniform sampling
+        sampler = EventWeightedSampler([False] * 10)
+        self.assertEqual(10, len(list(sampler)))
+        with self.assertRaises(ValueError):
+            EventWeightedSampler(contains_event, positive_ratio=2)
+
+    def test_from_dataset(self):
+        data_path = 'data/raw'
+        ds = RawOscarDataset(data_path=data_path)
+        sampler = EventWeightedSampler.from_dataset(ds, positive_ratio=1.0)
+        self.assertListEqual([0, 0], list(sampler))
+
+        ds = WindowedOscarDataset(data_path=data_path, window_length=250)
+        expected_events = [bool(ds[i][1].any()) for i in range(len(ds))]
+        self.assertListEqual(expected_events, [ds.contains_event(i) for i in range(len(ds))])
+        self.assertListEqual(expected_events, ds.contains_event_array().tolist())
+
+        sampler = EventWeightedSampler.from_dataset(ds, positive_ratio=0.5, num_samples=64)
+        loader = DataLoader(ds, batch_size=16, sampler=sampler, num_workers=2)
+        labels = torch.cat([y for _, y in loader])
+        self.assertEqual((64, 250, 1), tuple(labels.shape))
+        self.assertGreater(labels.amax(dim=(1, 2)).sum(), 0)
@@ -0,0 +1,55 @@
+from collections import Counter
+from unittest import TestCase
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from pyapnea.pytorch.iterable_oscar_dataset import IterableOscarDataset
+from pyapnea.pytorch.windowed_oscar_dataset import WindowedOscarDataset
+
+
+class TestIterableOscarDataset(TestCase):
+    def test___iter__(self):
+        data_path = 'data/raw'
+        expected_ds = WindowedOscarDataset(data_path=data_path, window_length=250, stride=100)
+        windows = list(IterableOscarDataset(data_path=data_path, window_length=250, stride=100))
+
+        self.assertEqual(len(expected_ds), len(windows))
+        for i in range(len(expected_ds)):
+            np.testing.assert_array_equal(expected_ds[i][0], windows[i][0])
+            np.testing.assert_array_equal(expected_ds[i][1], windows[i][1])
+
+    def test_sharding(self):
+        data_path = 'data/raw'
+        windows = [x.tobytes() for x, _ in IterableOscarDataset(data_path=data_path, window_length=250)]
+        # fewer files than ranks: all ranks get the same number of windows
+        for world_size in [2, 3, 5]:
+            shards = [[x.tobytes() for x, _ in IterableOscarDataset(data_path=data_path, window_length=250,
+                                                                    rank=rank, world_size=world_size)]
+                      for rank in range(world_size)]
+            expected_length = -(-len(windows) // world_size)
+            self.assertListEqual([expected_length] * world_size, [len(shard) for shard in shards])
+            # all windows, then the first windows again
+            all_windows = [x for shard in shards for x in shard]
+            self.assertListEqual(windows, all_windows[:len(windows)])
+            self.assertListEqual(windows[:len(all_windows) - len(windows)], all_windows[len(windows):])
+
+        ds = IterableOscarDataset(data_path=data_path, window_length=250, rank=1, world_size=2)
+        self.assertEqual(len(ds), sum(end - first for _, first, end in ds.get_windows()))
+
+    def test_shuffle(self):
+        data_path = 'data/raw'
+        windows = list(IterableOscarDataset(data_path=data_path, window_length=250, stride=100))
+        ds = IterableOscarDataset(data_path=data_path, window_length=250, stride=100, shuffle=True,
+                                  shuffle_buffer_size=64)
+        loader = DataLoader(ds, batch_size=32, num_workers=2)
+        samples = torch.cat([x for x, _ in loader]).numpy()
+        # same windows in another order
+        self.assertEqual(Counter(x.tobytes() for x, _ in windows), Counter(x.tobytes() for x in samples))
+        self.assertFalse(all(np.array_equal(x, y) for (x, _), y in zip(windows, samples)))
+
+        first_epoch = [x for x, _ in ds]
+        ds.set_epoch(1)
+        second_epoch = [x for x, _ in ds]
+        self.assertFalse(all(np.array_equal(x, y) for x, y in zip(first_epoch, second_epoch)))
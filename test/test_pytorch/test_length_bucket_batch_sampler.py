@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from pyapnea.pytorch.length_bucket_batch_sampler import LengthBucketBatchSampler, pad_collate
+from pyapnea.pytorch.raw_oscar_dataset import RawOscarDataset
+
+
+class TestLengthBucketBatchSampler(TestCase):
+    def test_batches(self):
+        lengths = np.random.default_rng(0).integers(1, 1000, size=103)
+        sampler = LengthBucketBatchSampler(lengths, batch_size=10, bucket_size_multiplier=3)
+        batches = list(sampler)
+
+        self.assertEqual(len(sampler), len(batches))
+        self.assertListEqual(list(range(103)), sorted(i for batch in batches for i in batch))
+        self.assertTrue(all(len(batch) <= 10 for batch in batches))
+        # batches are sorted by length inside a bucket
+        self.assertTrue(all(np.all(np.diff(lengths[batch]) >= 0) for batch in batches))
+
+        sampler = LengthBucketBatchSampler(lengths, batch_size=10, shuffle=False, drop_last=True)
+        batches = list(sampler)
+        self.assertEqual(10, len(batches))
+        self.assertListEqual(sorted(lengths)[:10], lengths[batches[0]].tolist())
+
+        sampler = LengthBucketBatchSampler(lengths, batch_size=10)
+        first_epoch = list(sampler)
+        sampler.set_epoch(1)
+        self.assertNotEqual(first_epoch, list(sampler))
+
+    def test_pad_collate(self):
+        data_path = 'data/raw'
+        ds = RawOscarDataset(data_path=data_path)
+        lengths = ds.item_lengths()
+        self.assertListEqual([len(ds[i][0]) for i in range(len(ds))], lengths.tolist())
+
+        loader = DataLoader(ds, batch_sampler=LengthBucketBatchSampler.from_dataset(ds, batch_size=2),
+                            collate_fn=pad_collate)
+        x, y, batch_lengths, mask = next(iter(loader))
+        self.assertEqual((2, lengths.max(), 1), tuple(x.shape))
+        self.assertEqual((2, lengths.max(), 1), tuple(y.shape))
+        self.assertListEqual(sorted(lengths.tolist()), batch_lengths.tolist())
+        self.assertListEqual(batch_lengths.tolist(), mask.sum(dim=1).tolist())
+        self.assertEqual(0, x[0, batch_lengths[0]:].abs().sum())
+        np.testing.assert_array_equal(ds[int(np.argmin(lengths))][0], x[0, :batch_lengths[0]].numpy())
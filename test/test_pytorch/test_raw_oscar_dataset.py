@@ -1,7 +1,15 @@
+import os
+import tempfile
 from unittest import TestCase
 
+import numpy as np
+import pandas as pd
+import torch
+
+from pyapnea import ChannelID
 from pyapnea.pytorch.raw_oscar_dataset import RawOscarDataset
-from pyapnea.utils.annotations import get_nb_events
+from pyapnea.utils.annotations import get_nb_events, is_contain_event
+from pyapnea.utils.cache import get_nbytes
 
 
 class TestRawOscarDataset(TestCase):
@@ -17,3 +25,111 @@ class TestRawOscarDataset(TestCase):
 
         nb_events, events = get_nb_events(ds)
         assert nb_events == 1
+
+    def test_disk_cache(self):
+        data_path = 'data/raw'
+        ds = RawOscarDataset(data_path=data_path, getitem_type='dataframe')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ds_cache = RawOscarDataset(data_path=data_path, getitem_type='dataframe', cache_dir=cache_dir)
+            for i in range(len(ds)):
+                expected_df = ds[i]
+                # first access fills the cache, second access reads it
+                self.assertTrue(expected_df.equals(ds_cache[i]))
+                self.assertTrue(expected_df.equals(ds_cache[i]))
+                self.assertTrue(expected_df.index.equals(ds_cache[i].index))
+            self.assertEqual(len(ds), len(os.listdir(cache_dir)))
+
+            # other parameters do not use the same entries
+            ds_cache = RawOscarDataset(data_path=data_path, getitem_type='numpy', length_event=None,
+                                       cache_dir=cache_dir)
+            expected_ds = RawOscarDataset(data_path=data_path, getitem_type='numpy', length_event=None)
+            np.testing.assert_array_equal(expected_ds[0][1], ds_cache[0][1])
+            np.testing.assert_array_equal(expected_ds[0][1], ds_cache[0][1])
+
+    def test_memory_cache(self):
+        data_path = 'data/raw'
+        ds = RawOscarDataset(data_path=data_path)
+        first_element = ds[0]
+        elements_nbytes = [get_nbytes(ds[i]) for i in range(2)]
+
+        # room for any one of the first two elements, not for both
+        ds_cache = RawOscarDataset(data_path=data_path, memory_cache_bytes=max(elements_nbytes))
+        np.testing.assert_array_equal(first_element[0], ds_cache[0][0])
+        np.testing.assert_array_equal(first_element[0], ds_cache[0][0])
+        self.assertEqual(1, ds_cache.memory_cache.hits)
+        self.assertEqual(1, ds_cache.memory_cache.misses)
+        self.assertIn(0, ds_cache.memory_cache)
+
+        # the second element is cached and the first one is evicted
+        ds_cache[1]
+        self.assertEqual(1, ds_cache.memory_cache.hits)
+        self.assertEqual(2, ds_cache.memory_cache.misses)
+        self.assertIn(1, ds_cache.memory_cache)
+        self.assertNotIn(0, ds_cache.memory_cache)
+        self.assertEqual(elements_nbytes[1], ds_cache.memory_cache.nbytes)
+
+        ds_cache[0]
+        self.assertEqual(1, ds_cache.memory_cache.hits)
+        self.assertEqual(3, ds_cache.memory_cache.misses)
+
+    def test_event_index(self):
+        data_path = 'data/raw'
+        for output_events_merged in [None, [ChannelID.CPAP_Hypopnea]]:
+            ds = RawOscarDataset(data_path=data_path, output_events_merged=output_events_merged)
+            expected_events = [is_contain_event(element, ds.getitem_type) for element in ds]
+
+            self.assertListEqual(expected_events, ds.event_index().contains_event().tolist())
+            self.assertListEqual(expected_events, [ds.contains_event(i) for i in range(len(ds))])
+            self.assertListEqual(expected_events, ds.contains_event_array().tolist())
+            # computed once
+            self.assertIs(ds.contains_event_array(), ds.contains_event_array())
+
+    def test_output_events_merged_values(self):
+        data_path = 'data/raw'
+        # channel ids (.value) as in the tutorial
+        for channel_id in [ChannelID.CPAP_Obstructive, ChannelID.CPAP_ClearAirway]:
+            ds_values = RawOscarDataset(data_path=data_path, getitem_type='dataframe',
+                                        output_events_merged=[channel_id.value])
+            ds = RawOscarDataset(data_path=data_path, getitem_type='dataframe', output_events_merged=[channel_id])
+            for i in range(len(ds)):
+                pd.testing.assert_frame_equal(ds[i], ds_values[i])
+        self.assertGreater(ds_values[0]['ApneaEvent'].sum(), 0)
+
+    def test_output_events_merged_getitem_types(self):
+        data_path = 'data/raw'
+        for output_events_merged in [[ChannelID.CPAP_ClearAirway], [ChannelID.CPAP_ClearAirway.value]]:
+            ds_dataframe = RawOscarDataset(data_path=data_path, getitem_type='dataframe', length_event='10s',
+                                           output_events_merged=output_events_merged)
+            ds_numpy = RawOscarDataset(data_path=data_path, getitem_type='numpy', length_event='10s',
+                                       output_events_merged=output_events_merged)
+            for i in range(len(ds_numpy)):
+                np.testing.assert_array_equal(ds_dataframe[i][['ApneaEvent']].to_numpy(), ds_numpy[i][1])
+            self.assertGreater(ds_numpy[0][1].sum(), 0)
+
+    def test_getitem_types(self):
+        data_path = 'data/raw'
+        ds_dataframe = RawOscarDataset(data_path=data_path, getitem_type='dataframe')
+        ds_numpy = RawOscarDataset(data_path=data_path, getitem_type='numpy')
+        ds_torch = RawOscarDataset(data_path=data_path, getitem_type='torch')
+        for i in range(len(ds_dataframe)):
+            df = ds_dataframe[i]
+            x, y = ds_numpy[i]
+            np.testing.assert_array_equal(df[['FlowRate']].to_numpy(), x)
+            np.testing.assert_array_equal(df[['ApneaEvent']].to_numpy(), y)
+
+            x_tensor, y_tensor = ds_torch[i]
+            self.assertEqual(torch.float32, x_tensor.dtype)
+            np.testing.assert_array_equal(x.astype(np.float32), x_tensor.numpy())
+            np.testing.assert_array_equal(y.astype(np.float32), y_tensor.numpy())
+
+        # other channels are merged with a dataframe
+        channel_ids = [ChannelID.CPAP_FlowRate.value, ChannelID.CPAP_Leak.value]
+        df = RawOscarDataset(data_path=data_path, getitem_type='dataframe', channel_ids=channel_ids)[0]
+        x, y = RawOscarDataset(data_path=data_path, channel_ids=channel_ids)[0]
+        np.testing.assert_array_equal(df[['FlowRate']].to_numpy(), x)
+        np.testing.assert_array_equal(df[['ApneaEvent']].to_numpy(), y)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ds_cache = RawOscarDataset(data_path=data_path, getitem_type='torch', cache_dir=cache_dir)
+            np.testing.assert_array_equal(ds_torch[0][1].numpy(), ds_cache[0][1].numpy())
+            np.testing.assert_array_equal(ds_torch[0][1].numpy(), ds_cache[0][1].numpy())
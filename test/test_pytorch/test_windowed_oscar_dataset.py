@@ -0,0 +1,61 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from pyapnea.oscar.oscar_constants import ChannelID
+from pyapnea.oscar.oscar_loader import load_session
+from pyapnea.oscar.oscar_writer import save_session
+from pyapnea.pytorch.windowed_oscar_dataset import WindowedOscarDataset
+
+
+class TestWindowedOscarDataset(TestCase):
+    def test___getitem__(self):
+        data_path = 'data/raw'
+        ds = WindowedOscarDataset(data_path=data_path, window_length=1000, stride=500)
+
+        nb_windows = 0
+        for filename in ds.list_files:
+            oscar_session_data = load_session(filename, channels=[ChannelID.CPAP_FlowRate.value])
+            for evt in oscar_session_data.data.channels[0].events:
+                nb_windows += (evt.evcount - 1000) // 500 + 1
+        assert len(ds) == nb_windows
+
+        oscar_session_data = load_session(ds.list_files[ds.window_file[-1]], channels=[ChannelID.CPAP_FlowRate.value])
+        evt = oscar_session_data.data.channels[0].events[ds.window_event[-1]]
+        start = ds.window_start[-1]
+        x, y = ds[len(ds) - 1]
+        assert x.shape == (1000, 1)
+        assert y.shape == (1000, 1)
+        np.testing.assert_allclose(evt.data[start:start + 1000] * evt.gain, x[:, 0], rtol=1e-6)
+
+    def test_annotations(self):
+        data_path = 'data/raw'
+        ds = WindowedOscarDataset(data_path=data_path, window_length=250, length_event=None)
+        labels = np.concatenate([ds[i][1] for i in range(len(ds))])
+        # one annotated sample by event in the windows
+        assert 0 < labels.sum() <= sum(len(intervals) for intervals in ds.event_intervals)
+
+        ds = WindowedOscarDataset(data_path=data_path, window_length=250,
+                                  output_events_merged=[ChannelID.CPAP_Hypopnea])
+        labels = np.concatenate([ds[i][1] for i in range(len(ds))])
+        assert labels.sum() == 0
+
+    def test_compressed(self):
+        data_path = 'data/raw'
+        ds = WindowedOscarDataset(data_path=data_path, window_length=1000, stride=500)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for filename in ds.list_files:
+                compressed_filename = os.path.join(temp_dir, os.path.relpath(filename, data_path))
+                os.makedirs(os.path.dirname(compressed_filename), exist_ok=True)
+                save_session(load_session(filename), compressed_filename, compress=True)
+            ds_compressed = WindowedOscarDataset(data_path=temp_dir, window_length=1000, stride=500)
+            for i in range(len(ds)):
+                x, y = ds_compressed[i]
+                np.testing.assert_array_equal(ds[i][0], x)
+                np.testing.assert_array_equal(ds[i][1], y)
+
+        # each file is decompressed once
+        self.assertEqual(len(set(ds.window_file.tolist())), ds_compressed.compressed_cache.misses)
+        self.assertEqual(len(ds) - ds_compressed.compressed_cache.misses, ds_compressed.compressed_cache.hits)